@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+from backup_data import BackupJob
+
+# Builds synthetic source trees and times the stages of a backup on them, so versions can be compared.
+#   python backup_bench.py [--scales small medium] [--repeat 3] [--output results.json]
+#   python backup_bench.py --scales small --set "Copy threads=4" --option "Verify checksums after"
+#   python backup_bench.py --compare old.json [--threshold 1.25]
+# The trees come from a fixed seed, so a scale is the same tree on every run and every version.
+# The videos are sparse in the source but written out in full at the destination, so leave room for them.
+# Nothing clears the page cache between stages, compare runs made the same way on the same machine.
+
+# What goes in the tree at each scale
+SCALES = {
+    'small': {'Tiny files': 2000, 'Depth': 20, 'Videos': 2, 'Video size (MB)': 64, 'Versioned groups': 10},
+    'medium': {'Tiny files': 20000, 'Depth': 50, 'Videos': 4, 'Video size (MB)': 256, 'Versioned groups': 50},
+    'large': {'Tiny files': 200000, 'Depth': 100, 'Videos': 4, 'Video size (MB)': 1024, 'Versioned groups': 200}
+}
+TINY_FILES_PER_FOLDER = 100
+TINY_FILE_EXTENSIONS = ('.txt', '.jpg', '.dpx', '.wav', '.xml')
+FILTERED_EXTENSION = '.tmp'  # Given to the job as a filter
+BASE_MTIME = 1700000000  # Every file gets a date modified from here on, for the same tree every time
+DAY = 86400
+STAGES = ('get_file_list', 'reproduce_folder_structure', 'copy_files', 'check_metadata', 'delete_source_files')
+
+
+def make_tree(root: str, dicScale: dict, seed: int = 0) -> dict:
+    """
+    Fills a folder with a synthetic source tree: lots of tiny files (some invisible, some filtered out)
+    spread over nested project folders, a chain of deeply nested folders, huge sparse videos under VFX
+    (all kept), and groups of .mov versions made on different days (only the latest day is kept).
+    :param root: the folder to fill, made if needed
+    :param dicScale: one of SCALES
+    :param seed: for the file sizes and contents
+    :return: what was made, for the results
+    """
+    rng = random.Random(seed)
+    dicCounts = {'Files': 0, 'Folders': 0, 'Bytes': 0}
+
+    def make_file(path: str, data: bytes = b'', size: int = None, mtime: float = BASE_MTIME):
+        with open(path, 'wb') as file:
+            file.write(data)
+            if size is not None:
+                file.truncate(size)  # Sparse, takes no space in the source
+        os.utime(path, (mtime, mtime))
+        dicCounts['Files'] += 1
+        dicCounts['Bytes'] += len(data) if size is None else size
+
+    def make_folder(path: str):
+        os.makedirs(path)
+        dicCounts['Folders'] += 1
+
+    os.makedirs(root, exist_ok=True)
+
+    # Tiny files, one in ten invisible and one in twenty of a filtered type, some folders invisible
+    folder = None
+    for count in range(dicScale['Tiny files']):
+        if count % TINY_FILES_PER_FOLDER == 0:
+            project, shot = divmod(count // TINY_FILES_PER_FOLDER, 10)
+            folder = os.path.join(root, f"project{project:03d}", f"shot{shot:02d}")
+            if shot % 7 == 3:
+                folder = os.path.join(folder, '.cache')
+            make_folder(folder)
+        if count % 20 == 0:
+            name = f"render{count:06d}{FILTERED_EXTENSION}"
+        else:
+            name = f"file{count:06d}{TINY_FILE_EXTENSIONS[count % len(TINY_FILE_EXTENSIONS)]}"
+        if count % 10 == 0:
+            name = '.' + name
+        make_file(os.path.join(folder, name), rng.randbytes(rng.randint(0, 4096)), mtime=BASE_MTIME + count)
+
+    # Deep nesting
+    folder = os.path.join(root, 'deep', *[f"level{level:03d}" for level in range(dicScale['Depth'])])
+    make_folder(folder)
+    make_file(os.path.join(folder, 'bottom.txt'), b'bottom')
+
+    # Huge videos, under VFX so they are all copied
+    folder = os.path.join(root, 'media', 'VFX')
+    make_folder(folder)
+    for count in range(dicScale['Videos']):
+        make_file(os.path.join(folder, f"plate{count:02d}.mov"), size=dicScale['Video size (MB)'] * 2**20)
+
+    # Versions of an edit made on different days, only the last day's are kept
+    for group in range(dicScale['Versioned groups']):
+        folder = os.path.join(root, 'edits', f"edit{group:03d}")
+        make_folder(folder)
+        for version in range(1, 4):
+            make_file(os.path.join(folder, f"cut_v{version:03d}.mov"), rng.randbytes(rng.randint(1024, 65536)),
+                      mtime=BASE_MTIME + version * DAY)
+        make_file(os.path.join(folder, "cut_v003.mp4"), rng.randbytes(2048), mtime=BASE_MTIME + 3 * DAY)
+
+    return dicCounts
+
+
+def make_job(pathSource: str, pathDest: str, dicSettings: dict, lstOptions: list) -> BackupJob:
+    """
+    A job over a benchmark tree, with the checks and deletion left to be timed separately
+    """
+    job = BackupJob()
+    job.set_source(pathSource)
+    job.add_destination(pathDest)
+    job.add_filter(FILTERED_EXTENSION)
+    dicOpts = job.get_options()
+    dicOpts.update({'Copy invisible files': True, 'Check sizes after': False, 'Delete after': False})
+    for option in lstOptions:
+        dicOpts[option] = True
+    job.set_options(dicOpts)
+    job.set_settings(dicSettings)
+    return job
+
+
+def timed(function, *args) -> float:
+    """
+    Seconds a call takes
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def run_scale(scale: str, workDir: str, repeat: int, seed: int, dicSettings: dict, lstOptions: list) -> dict:
+    """
+    Times each of STAGES on one scale of tree, repeat times, each into a new destination
+    :return: the results for the scale
+    """
+    pathScale = os.path.join(workDir, scale)
+    pathSource = os.path.join(pathScale, 'source')
+    dicTree = make_tree(pathSource, SCALES[scale], seed)
+    lstRuns = []
+    dicMetrics = {}
+    for run in range(repeat):
+        pathRun = os.path.join(pathScale, f"run{run}")
+        pathDest = os.path.join(pathRun, 'destination')
+        pathFolders = os.path.join(pathRun, 'folders only')
+        os.makedirs(pathDest)
+        os.makedirs(pathFolders)
+        job = make_job(pathSource, pathDest, dicSettings, lstOptions)
+        dicRun = {'get_file_list': timed(job.get_file_list, True)}
+
+        # On its own in a destination of its own, copy_files does it again as part of the copy
+        job.create_log(pathFolders)
+        dicRun['reproduce_folder_structure'] = timed(job.reproduce_folder_structure, pathFolders)
+
+        dicRun['copy_files'] = timed(job.copy_files)
+        dicMetrics = job.metrics.to_dict()
+        dicRun['check_metadata'] = timed(job.check_metadata)
+
+        # Deleting needs a source it can lose, made, scanned and checked against the copy outside the timing
+        pathDoomed = os.path.join(pathRun, 'source to delete')
+        make_tree(pathDoomed, SCALES[scale], seed)
+        jobDelete = make_job(pathDoomed, pathDest, dicSettings, lstOptions)
+        jobDelete.get_file_list(True)
+        jobDelete.create_log(pathDest)
+        jobDelete.check_metadata()
+        dicRun['delete_source_files'] = timed(jobDelete.delete_source_files)
+
+        lstRuns.append(dicRun)
+        print(f"{scale} run {run + 1}/{repeat}: " + ", ".join(f"{stage} {seconds:.3f}s"
+                                                              for stage, seconds in dicRun.items()))
+        shutil.rmtree(pathRun, ignore_errors=True)
+
+    return {
+        'Tree': dicTree,
+        'Runs': lstRuns,
+        'Median': {stage: statistics.median(dicRun[stage] for dicRun in lstRuns) for stage in STAGES},
+        'Best': {stage: min(dicRun[stage] for dicRun in lstRuns) for stage in STAGES},
+        'Metrics of the last copy': dicMetrics
+    }
+
+
+def get_version() -> str:
+    """
+    The git commit of the code being benchmarked, if it's in a repository
+    """
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare_results(dicNew: dict, dicOld: dict, threshold: float) -> list:
+    """
+    Compares the median times of two sets of results, for the scales and stages both have
+    :param threshold: how many times slower counts as a regression
+    :return: list of (scale, stage, old seconds, new seconds) that got slower by more than the threshold
+    """
+    lstRegressions = []
+    for scale, dicScale in dicNew['Scales'].items():
+        if scale not in dicOld['Scales']:
+            continue
+        for stage, seconds in dicScale['Median'].items():
+            old = dicOld['Scales'][scale]['Median'].get(stage)
+            if old is None:
+                continue
+            print(f"{scale} {stage}: {old:.3f}s -> {seconds:.3f}s ({seconds / old if old else float('inf'):.2f}x)")
+            if seconds > old * threshold:
+                lstRegressions.append((scale, stage, old, seconds))
+    return lstRegressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the stages of a backup on synthetic trees")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small'])
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each scale, the median is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--set', action='append', default=[], metavar='"SETTING=VALUE"',
+                        help="a job setting, like \"Copy threads=4\"")
+    parser.add_argument('--option', action='append', default=[], help="a job option to turn on")
+    parser.add_argument('--work-dir', help="where to build the trees, in a new folder of their own, "
+                                           "the system's temporary folder by default")
+    parser.add_argument('--keep', action='store_true', help="leave the trees there afterwards")
+    parser.add_argument('--output', help="JSON file for the results, named after the date by default")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=1.25, help="how many times slower is a regression")
+    args = parser.parse_args(argv)
+
+    dicSettings = {}
+    for setting in args.set:
+        name, value = setting.split('=', 1)
+        dicSettings[name.strip()] = int(value)
+    # Fail on a typo before building anything
+    make_job(os.getcwd(), os.getcwd(), dicSettings, args.option)
+
+    # Only ever a folder of our own, what's already in the work dir is left alone
+    workDir = tempfile.mkdtemp(prefix='paranoid_archivist_bench_', dir=args.work_dir)
+    now = datetime.now()
+    dicResults = {
+        'Date': now.isoformat(timespec='seconds'),
+        'Version': get_version(),
+        'Python': platform.python_version(),
+        'Platform': platform.platform(),
+        'Seed': args.seed,
+        'Settings': dicSettings,
+        'Options': args.option,
+        'Scales': {}
+    }
+    try:
+        for scale in args.scales:
+            dicResults['Scales'][scale] = run_scale(scale, workDir, args.repeat, args.seed, dicSettings, args.option)
+    finally:
+        if args.keep:
+            print(f"Trees left in {workDir}")
+        else:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    output = args.output or f"bench {now.strftime('%Y-%m-%d %H-%M-%S')}.json"
+    with open(output, 'w', encoding='UTF-8') as file:
+        json.dump(dicResults, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='UTF-8') as file:
+            dicOld = json.load(file)
+        lstRegressions = compare_results(dicResults, dicOld, args.threshold)
+        for scale, stage, old, new in lstRegressions:
+            print(f"Slower: {scale} {stage} {old:.3f}s -> {new:.3f}s")
+        return 1 if lstRegressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,14 +3,103 @@ import os
 import sys
 import shutil
 import csv
+import hashlib
 import re
+import json
+import pickle
+import sqlite3
+from array import array
 from datetime import date
 from datetime import datetime
+import time
 import subprocess  # Shamefully not cross-platform, for permissions
+import threading
+import multiprocessing
+import queue
+import errno
+import atexit
+import signal
+import weakref
+import struct
+import math
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from contextlib import contextmanager
+from itertools import takewhile, chain
+from collections import Counter
 
 # Get from Pip please
 import yaml
 
+try:
+    import fcntl  # UNIX only, for reflinks
+except ImportError:
+    fcntl = None
+
+# Where the app keeps its own data between runs
+PATH_APP_DATA = os.path.join(os.path.expanduser('~'), '.paranoid_archivist')
+
+# Size of the pieces files are read in when the kernel can't copy them for us
+COPY_CHUNK = 2**20
+
+# Smallest value a setting can take, those not here can be 0
+SETTING_MINIMUMS = {'Scan threads': 1, 'Fan-out buffer (MB)': 1, 'Copy threads': 1, 'Large file threshold (MB)': 1,
+                    'Copy buffer (MB)': 1, 'Verify threads': 1, 'Delete threads': 1}
+
+# Log rows are written in batches, when this many are waiting or this many seconds have passed
+LOG_BATCH_ROWS = 1000
+LOG_FLUSH_SECONDS = 2
+
+# Most files the scanner can get ahead of the copy when copying while scanning
+STREAM_QUEUE_FILES = 10000
+
+# ioctl asking btrfs/XFS (and others) to share the source's blocks rather than copy them
+FICLONE = 0x40049409
+
+# Errors from copy_file_range/sendfile that mean "not here", rather than a real failure
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY}
+
+# How far apart two date modifieds can be and still count as the same (FAT rounds to 2 seconds)
+MTIME_TOLERANCE = 2
+
+# Most paths given to one chmod when clearing ACLs on macOS, well inside the argument length limit
+CHMOD_BATCH = 500
+
+# Checksum manifests are written next to the logs, one per run, with these columns
+MANIFEST_SUFFIX = ' manifest.csv'
+MANIFEST_HEADER = ["Path", "Size", "Date modified", "BLAKE2b"]
+
+# A file in a spilled scan run: folder index, size, date modified, flags, then the length of the name
+SPILL_RECORD = struct.Struct('<IqdBH')
+
+# Rough memory taken by one file in the store, on top of its name
+STORE_BYTES_PER_FILE = 80
+
+# The resume journal of a queue run is synced to the disk this often
+JOURNAL_SYNC_SECONDS = 10
+
+# Most jobs run_queue runs at once, when they don't share any drives
+QUEUE_MAX_JOBS = 4
+
+# The settings a run can be throttled by, how many seconds' worth a throttle lets through in a burst,
+# and how often a throttled thread looks again in case the limit has been changed
+LIMIT_SETTINGS = ('Max MB/s', 'Max files/s')
+LIMIT_BURST_SECONDS = 0.5
+LIMIT_RECHECK_SECONDS = 0.25
+
+# Layout of a ProgressBlock: each job's record is its fields then those of each of its destinations,
+# followed separately by room for the name of the file it's on
+PROGRESS_JOB_FIELDS = ('Bytes', 'Files', 'Total bytes', 'Total files', 'State', 'Started', 'Finished', 'Name sequence')
+PROGRESS_DEST_FIELDS = ('Bytes', 'Files', 'Errors')
+PROGRESS_NAME_BYTES = 1024
+PROGRESS_STATES = ('Waiting', 'Running', 'Done', 'Cancelled', 'Failed')
+
+# Run metrics time each file into a histogram by its size (bytes, up to) and how long it took (seconds, up to)
+METRICS_SIZE_BUCKETS = (2**16, 2**20, 2**24, 2**28, 2**32)
+METRICS_SECONDS_BUCKETS = (0.001, 0.01, 0.1, 1, 10, 100)
+METRICS_PREFIX = 'paranoid_archivist'
+
 # NOTES:
 #       - Things TPA cannot do:
 #           - Skip files without an extension
@@ -19,6 +108,1568 @@ import yaml
 #         if things change after the calculation, things could go screwy.
 
 
+def _copy_range(inFd: int, outFd: int, size: int):
+    """
+    Copies with os.copy_file_range, the kernel moves the data (or the filesystem clones it)
+    """
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(inFd, outFd, size - copied)
+        if sent == 0:
+            if copied == 0:
+                # Some filesystems report nothing to copy, let the next method try
+                raise OSError(errno.EINVAL, "copy_file_range copied nothing")
+            break  # The file shrank
+        copied += sent
+
+
+def _send_file(inFd: int, outFd: int, size: int):
+    """
+    Copies with os.sendfile, file to file only works on Linux
+    """
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.ENOTSUP, "sendfile only copies between files on Linux")
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(outFd, inFd, copied, size - copied)
+        if sent == 0:
+            if copied == 0:
+                raise OSError(errno.EINVAL, "sendfile copied nothing")
+            break
+        copied += sent
+
+
+class LogWriter:
+    """
+    Keeps a CSV log open and appends rows in batches from a background thread, instead of
+    opening and closing the file for every row.
+    Rows are written once LOG_BATCH_ROWS are waiting or LOG_FLUSH_SECONDS have passed,
+    and everything left is written on close, or at exit if it never gets closed.
+    If a batch can't be written (disk full etc.) nothing more is, and write and close raise an error
+    from then on, rather than rows going missing from the log without anyone knowing.
+    """
+    _setOpen = weakref.WeakSet()
+
+    def __init__(self, filePath: str, maxRows: int = LOG_BATCH_ROWS, maxDelay: float = LOG_FLUSH_SECONDS):
+        self.filePath = filePath
+        self.maxRows = maxRows
+        self.maxDelay = maxDelay
+        self._file = open(filePath, 'a', encoding='UTF-8')
+        self._writer = csv.writer(self._file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self._lstRows = []
+        self._closed = False
+        self._error = None  # What stopped the rows being written
+        self._lockFile = threading.Lock()  # Held while a batch is taken and written, keeps batches in order
+        self._condRows = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='log writer', daemon=True)
+        self._thread.start()
+        LogWriter._setOpen.add(self)
+
+    def write(self, row: list):
+        """
+        Queues a row to be written
+        """
+        with self._condRows:
+            if self._error is not None:
+                raise IOError(f"Log {self.filePath} can't be written: {self._error}") from self._error
+            if self._closed:
+                raise ValueError(f"Log {self.filePath} is closed")
+            self._lstRows.append(row)
+            if len(self._lstRows) >= self.maxRows:
+                self._condRows.notify()
+
+    def flush(self):
+        """
+        Writes out any waiting rows now
+        """
+        with self._lockFile:
+            with self._condRows:
+                lstRows, self._lstRows = self._lstRows, []
+            if lstRows and not self._file.closed:
+                try:
+                    self._write_rows(lstRows)
+                except Exception:
+                    # Still waiting to be written
+                    with self._condRows:
+                        self._lstRows[:0] = lstRows
+                    raise
+
+    def _write_rows(self, lstRows: list):
+        # Call with the file lock held
+        self._writer.writerows(lstRows)
+        self._file.flush()
+
+    def close(self):
+        """
+        Writes out the waiting rows and closes the file
+        :raises IOError: if any rows couldn't be written
+        """
+        with self._condRows:
+            if self._closed:
+                return
+            self._closed = True
+            self._condRows.notify()
+        self._thread.join()
+        with self._lockFile:
+            try:
+                self._file.close()
+            except OSError as e:
+                self._error = self._error or e
+        LogWriter._setOpen.discard(self)
+        if self._error is not None:
+            raise IOError(f"Log {self.filePath} can't be written, {len(self._lstRows)} rows lost: "
+                          f"{self._error}") from self._error
+
+    def _run(self):
+        while True:
+            with self._condRows:
+                self._condRows.wait_for(lambda: self._closed or len(self._lstRows) >= self.maxRows,
+                                        timeout=self.maxDelay)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                # Nothing more gets written, write and close raise it
+                with self._condRows:
+                    self._error = e
+                return
+            if closed:
+                return
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes every log still open, so nothing is lost when the process ends
+        :raises IOError: once they're all closed, for the first that couldn't be written
+        """
+        error = None
+        for logWriter in list(cls._setOpen):
+            try:
+                logWriter.close()
+            except IOError as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+
+atexit.register(LogWriter.close_all)
+
+
+def sync_file(path: str) -> bool:
+    """
+    Waits for a file (or on UNIX a folder) to be written to the disk, out of the OS's cache
+    :return: False if it couldn't be synced
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY if os.name == 'posix' else os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        os.fsync(fd)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+class Journal(LogWriter):
+    """
+    Append-only record of what a queue run has done, so that a run that dies part way through (crash,
+    power cut, reboot...) can be resumed, see QueueToBackup.run_queue.
+    Rows are ["Started", job, destination, file] before a file is copied, ["Done", job, destination, file]
+    once it's there, and ["Job done", job, "", ""] once a whole job (checks and all) is finished.
+    A copy is fsynced by the thread that made it before its "Done" row is written (see BackupJob.journal_file),
+    and every batch is fsynced after fsyncing the folders of its "Done" rows, so a file is never recorded as
+    done before its copy is safely written. Only those files are synced, not the whole machine, other disks
+    and network shares are left alone.
+    """
+    def __init__(self, filePath: str, maxDelay: float = JOURNAL_SYNC_SECONDS):
+        # Batches go by time only, a sync for every few rows would cost too much
+        super().__init__(filePath, sys.maxsize, maxDelay)
+
+    def _write_rows(self, lstRows: list):
+        if os.name == 'posix':
+            for folder in {os.path.dirname(os.path.join(row[2], row[3])) for row in lstRows if row[0] == 'Done'}:
+                sync_file(folder)
+        self._writer.writerows(lstRows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def read(filePath: str) -> tuple:
+        """
+        Reads back a journal, ignoring a last row cut short
+        :return: (set of jobs done, {job: set of (destination, file) done},
+                  {job: set of (destination, file) started but not done})
+        """
+        setJobsDone = set()
+        dicDone = {}
+        dicInFlight = {}
+        with open(filePath, 'r', encoding='UTF-8', newline='') as file:
+            for row in csv.reader(file):
+                if len(row) != 4 or not row[1].isdigit():
+                    continue
+                kind, job, pathDest, relPath = row[0], int(row[1]), row[2], row[3]
+                if kind == 'Job done':
+                    setJobsDone.add(job)
+                elif kind == 'Started':
+                    dicInFlight.setdefault(job, set()).add((pathDest, relPath))
+                elif kind == 'Done':
+                    dicDone.setdefault(job, set()).add((pathDest, relPath))
+                    dicInFlight.get(job, set()).discard((pathDest, relPath))
+        return setJobsDone, dicDone, dicInFlight
+
+
+class CopyCancelled(Exception):
+    """
+    Raised when the user cancels in the middle of copying a file
+    """
+    pass
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by the threads of a run. Taking more than is available goes into debt, and each
+    taker waits its turn until the rate has paid for what it took, so a whole file can be taken at once
+    and the average still holds. The rate is read through a function, and read again while waiting,
+    so it can be changed while the run goes.
+    """
+    def __init__(self, getRate, burstSeconds: float = LIMIT_BURST_SECONDS):
+        """
+        :param getRate: function returning the units allowed per second, 0 or less for no limit
+        :param burstSeconds: how many seconds' worth can build up while nothing is taken
+        """
+        self.getRate = getRate
+        self.burstSeconds = burstSeconds
+        self._taken = 0.0  # Units taken since the start
+        self._granted = 0.0  # Units the rate has allowed since the start
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> float:
+        # Call with the lock held, returns the current rate
+        rate = self.getRate()
+        now = time.monotonic()
+        if rate <= 0:
+            self._granted = self._taken  # No limit, no debt
+        else:
+            self._granted = min(self._taken + rate * self.burstSeconds, self._granted + (now - self._last) * rate)
+        self._last = now
+        return rate
+
+    def take(self, amount: float, cancel=None):
+        """
+        Waits until amount can be had within the rate. Returns early once cancel is set.
+        :param amount: units (bytes, files...) about to be used
+        :param cancel: optional Event to stop waiting
+        """
+        with self._lock:
+            self._refill()
+            self._taken += amount
+            mark = self._taken
+        while True:
+            with self._lock:
+                rate = self._refill()
+                if rate <= 0 or self._granted >= mark:
+                    return
+                delay = min((mark - self._granted) / rate, LIMIT_RECHECK_SECONDS)
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                return
+
+
+def _reflink(inFd: int, outFd: int) -> bool:
+    """
+    Asks the filesystem to share the source's blocks with the destination
+    :return: True if it did
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(outFd, FICLONE, inFd)
+        return True
+    except OSError:
+        return False
+
+
+def copy_file_fast(src: str, dest: str) -> str:
+    """
+    Copies a file and its metadata like shutil.copy2, trying the cheapest method first:
+    a reflink (FICLONE), then os.copy_file_range, then os.sendfile, then reading and writing.
+    :param src: source file path
+    :param dest: destination file path
+    :return: the name of the method that did the copy
+    """
+    with open(src, 'rb') as fileSrc, open(dest, 'wb') as fileDest:
+        inFd = fileSrc.fileno()
+        outFd = fileDest.fileno()
+        backend = 'reflink' if _reflink(inFd, outFd) else None
+
+        if backend is None:
+            size = os.fstat(inFd).st_size
+            for name, method in (('copy_file_range', _copy_range), ('sendfile', _send_file)):
+                if name == 'copy_file_range' and not hasattr(os, 'copy_file_range'):
+                    continue
+                try:
+                    method(inFd, outFd, size)
+                    backend = name
+                    break
+                except OSError as e:
+                    if e.errno not in FALLBACK_ERRNOS:
+                        raise
+                    # Start again from scratch with the next method
+                    os.lseek(inFd, 0, os.SEEK_SET)
+                    os.lseek(outFd, 0, os.SEEK_SET)
+                    os.ftruncate(outFd, 0)
+
+        if backend is None:
+            shutil.copyfileobj(fileSrc, fileDest, COPY_CHUNK)
+            backend = 'read/write'
+
+    shutil.copystat(src, dest)
+    return backend
+
+
+def copy_file_chunked(src: str, dest: str, bufferSize: int, callback=None, cancel=None, hasher=None) -> str:
+    """
+    Copies a big file and its metadata a piece at a time, so progress can be reported and the
+    copy cancelled part way. Tries a reflink first, then os.copy_file_range, then reading and writing.
+    :param src: source file path
+    :param dest: destination file path
+    :param bufferSize: bytes to copy per piece
+    :param callback: called with the number of bytes after each piece
+    :param cancel: optional Event, raises CopyCancelled between pieces once it is set
+    :param hasher: optional hashlib object, fed everything read from the source. The kernel methods
+                   never show us the data, so this always reads and writes.
+    :return: the name of the method that did the copy
+    :raises OSError: if less or more was copied than the source's size
+    """
+    if bufferSize < 1:
+        raise ValueError(f"Buffer size should be at least 1 byte, not {bufferSize}")
+    with open(src, 'rb', buffering=0) as fileSrc, open(dest, 'wb', buffering=0) as fileDest:
+        inFd = fileSrc.fileno()
+        outFd = fileDest.fileno()
+        size = os.fstat(inFd).st_size
+        if hasher is None and _reflink(inFd, outFd):
+            if callback:
+                callback(size)
+            copied = size
+            backend = 'reflink'
+        else:
+            useRange = hasher is None and hasattr(os, 'copy_file_range')
+            view = None
+            copied = 0
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise CopyCancelled("Cancelled by user")
+                if useRange:
+                    try:
+                        n = os.copy_file_range(inFd, outFd, bufferSize)
+                    except OSError as e:
+                        if copied or e.errno not in FALLBACK_ERRNOS:
+                            raise
+                        useRange = False
+                        continue
+                    if n == 0 and copied == 0 and size:
+                        # Filesystem reports nothing to copy, read it ourselves instead
+                        useRange = False
+                        continue
+                else:
+                    if view is None:
+                        view = memoryview(bytearray(bufferSize))
+                    n = fileSrc.readinto(view)
+                    if hasher is not None:
+                        hasher.update(view[:n])
+                    written = 0
+                    while written < n:
+                        written += fileDest.write(view[written:n])
+                if not n:
+                    break
+                copied += n
+                if callback:
+                    callback(n)
+            backend = 'copy_file_range (chunked)' if useRange else 'read/write (chunked)'
+        if copied != size or os.fstat(outFd).st_size != size:
+            raise OSError(errno.EIO, f"Copied {copied} bytes of {size}", dest)
+
+    shutil.copystat(src, dest)
+    return backend
+
+
+def drop_cache(fd: int):
+    """
+    Flushes a file and asks the OS to forget its cached pages, so reading it goes to the disk.
+    Best effort, some filesystems and platforms ignore it.
+    :param fd: file descriptor of the open file
+    """
+    try:
+        os.fsync(fd)  # Pages not yet written can't be dropped
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        elif fcntl is not None and hasattr(fcntl, 'F_NOCACHE'):
+            fcntl.fcntl(fd, fcntl.F_NOCACHE, 1)  # macOS
+    except OSError:
+        pass
+
+
+def hash_file(filePath: str, bufferSize: int = COPY_CHUNK, dropCache: bool = False, cancel=None,
+              callback=None) -> bytes:
+    """
+    BLAKE2b checksum of a file
+    :param filePath: the file to read
+    :param bufferSize: bytes to read at a time
+    :param dropCache: read from the disk rather than the page cache, see drop_cache
+    :param cancel: optional Event, raises CopyCancelled between pieces once it is set
+    :param callback: optional, called with the number of bytes after each piece is read
+    :return: the digest
+    """
+    hasher = hashlib.blake2b()
+    with open(filePath, 'rb', buffering=0) as file:
+        if dropCache:
+            drop_cache(file.fileno())
+        view = memoryview(bytearray(bufferSize))
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise CopyCancelled("Cancelled by user")
+            n = file.readinto(view)
+            if not n:
+                break
+            hasher.update(view[:n])
+            if callback is not None:
+                callback(n)
+    return hasher.digest()
+
+
+def imap_threaded(function, iterable, threads: int, window: int = None):
+    """
+    Runs a function over an iterable with a pool of threads, keeping only a window of items in flight
+    so long file lists aren't turned into millions of futures at once.
+    :param function: called with each item
+    :param iterable: the items
+    :param threads: number of worker threads
+    :param window: most items queued or running at once, default 4 per thread
+    Yields (item, result) in the order they finish. Exceptions from the function are raised here.
+    """
+    if window is None:
+        window = threads * 4
+    dicPending = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        try:
+            for item in iterable:
+                if len(dicPending) >= window:
+                    done, _ = wait(dicPending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield dicPending.pop(future), future.result()
+                dicPending[executor.submit(function, item)] = item
+            while dicPending:
+                done, _ = wait(dicPending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield dicPending.pop(future), future.result()
+        finally:
+            for future in dicPending:
+                future.cancel()
+
+
+class ProgressBlock:
+    """
+    Progress of a queue run in shared memory, written by the copy process and read by the GUI.
+    A fixed layout of doubles, a record per job followed by one per destination (see PROGRESS_JOB_FIELDS and
+    PROGRESS_DEST_FIELDS), plus a buffer per job for the file it's on. There are no locks: the copy only writes
+    a job's record from one thread at a time (BackupJob.report_progress, report_current_file and write_log
+    hold the job's own lock), a double is read whole, and the file name has a sequence number that's odd
+    while it's being written, so a reader can tell it caught it half written and read it again.
+    Must be made before the copy process starts, to be handed to it.
+    """
+    def __init__(self, nJobs: int, nDests: int):
+        """
+        :param nJobs: number of jobs
+        :param nDests: most destinations any job has
+        """
+        self.nJobs = nJobs
+        self.nDests = nDests
+        self.stride = len(PROGRESS_JOB_FIELDS) + nDests * len(PROGRESS_DEST_FIELDS)
+        self.arrValues = multiprocessing.RawArray('d', nJobs * self.stride)
+        self.arrNames = multiprocessing.RawArray('c', nJobs * PROGRESS_NAME_BYTES)
+
+    def _offset(self, job: int, field: str, dest: int = None) -> int:
+        if dest is None:
+            return job * self.stride + PROGRESS_JOB_FIELDS.index(field)
+        return (job * self.stride + len(PROGRESS_JOB_FIELDS) + dest * len(PROGRESS_DEST_FIELDS)
+                + PROGRESS_DEST_FIELDS.index(field))
+
+    def get(self, job: int, field: str, dest: int = None) -> float:
+        """
+        Reads one value
+        :param job: the job's number in the queue
+        :param field: one of PROGRESS_JOB_FIELDS, or PROGRESS_DEST_FIELDS with dest
+        :param dest: the destination's number in the job, None for the job's own fields
+        """
+        return self.arrValues[self._offset(job, field, dest)]
+
+    def set(self, job: int, field: str, value: float, dest: int = None):
+        """
+        Writes one value, see get
+        """
+        self.arrValues[self._offset(job, field, dest)] = value
+
+    def add(self, job: int, field: str, value: float, dest: int = None):
+        """
+        Adds to one value, see get. Not atomic, only one thread may write a job's record at a time.
+        """
+        self.arrValues[self._offset(job, field, dest)] += value
+
+    def set_state(self, job: int, state: str):
+        """
+        Moves a job on to one of PROGRESS_STATES, noting when it started or finished
+        """
+        self.set(job, 'State', PROGRESS_STATES.index(state))
+        if state == 'Running':
+            self.set(job, 'Started', time.time())
+        elif state != 'Waiting':
+            self.set(job, 'Finished', time.time())
+
+    def get_state(self, job: int) -> str:
+        return PROGRESS_STATES[int(self.get(job, 'State'))]
+
+    def set_current_file(self, job: int, filePath: str):
+        """
+        Notes the file a job is on, cut short to PROGRESS_NAME_BYTES.
+        Only one thread may write a job's name at a time, see BackupJob.report_current_file.
+        """
+        bName = os.fsencode(filePath)[-(PROGRESS_NAME_BYTES - 1):]
+        start = job * PROGRESS_NAME_BYTES
+        self.add(job, 'Name sequence', 1)
+        self.arrNames[start:start + PROGRESS_NAME_BYTES] = bName.ljust(PROGRESS_NAME_BYTES, b'\0')
+        self.add(job, 'Name sequence', 1)
+
+    def get_current_file(self, job: int) -> str:
+        """
+        The file a job is on, '' if none (or if it's changing too fast to catch)
+        """
+        start = job * PROGRESS_NAME_BYTES
+        for attempt in range(10):
+            sequence = self.get(job, 'Name sequence')
+            if sequence % 2:
+                continue
+            bName = self.arrNames[start:start + PROGRESS_NAME_BYTES]
+            if self.get(job, 'Name sequence') == sequence:
+                return os.fsdecode(bName.rstrip(b'\0'))
+        return ''
+
+
+class LimitBlock:
+    """
+    The limits of a queue run in shared memory, changed by the GUI and read by the copy while it runs.
+    A fixed layout of doubles, a record per job of its own LIMIT_SETTINGS followed by those of each of
+    its destinations, 0 for no limit. A double is read and written whole, so there are no locks.
+    Must be made before the copy process starts, to be handed to it.
+    """
+    def __init__(self, nJobs: int, nDests: int):
+        """
+        :param nJobs: number of jobs
+        :param nDests: most destinations any job has
+        """
+        self.nJobs = nJobs
+        self.nDests = nDests
+        self.stride = (1 + nDests) * len(LIMIT_SETTINGS)
+        self.arrValues = multiprocessing.RawArray('d', nJobs * self.stride)
+
+    def _offset(self, job: int, limit: str, dest: int = None) -> int:
+        if dest is None:
+            return job * self.stride + LIMIT_SETTINGS.index(limit)
+        return job * self.stride + (1 + dest) * len(LIMIT_SETTINGS) + LIMIT_SETTINGS.index(limit)
+
+    def get(self, job: int, limit: str, dest: int = None) -> float:
+        """
+        Reads one limit
+        :param job: the job's number in the queue
+        :param limit: one of LIMIT_SETTINGS
+        :param dest: the destination's number in the job, None for the job's own limit
+        """
+        return self.arrValues[self._offset(job, limit, dest)]
+
+    def set(self, job: int, limit: str, value: float, dest: int = None):
+        """
+        Changes one limit, see get
+        """
+        self.arrValues[self._offset(job, limit, dest)] = value
+
+
+class ProgressRate:
+    """
+    Smoothed MB/s, files/s and time left for one job, from readings of its ProgressBlock record
+    taken every so often (by the GUI)
+    """
+    def __init__(self, smoothing: float = 0.3):
+        """
+        :param smoothing: weight of the newest reading, between 0 and 1, lower is steadier
+        """
+        self.smoothing = smoothing
+        self.bytesPerSecond = 0.0
+        self.filesPerSecond = 0.0
+        self._last = None
+
+    def update(self, progress: ProgressBlock, job: int, now: float = None) -> tuple:
+        """
+        Takes a reading
+        :param progress: the run's ProgressBlock
+        :param job: the job's number in it
+        :param now: time of the reading, defaults to now
+        :return: (bytes per second, files per second, seconds left or None if unknown)
+        """
+        now = time.monotonic() if now is None else now
+        bytesDone = progress.get(job, 'Bytes')
+        filesDone = progress.get(job, 'Files')
+        if progress.get_state(job) != 'Running':
+            self.bytesPerSecond = self.filesPerSecond = 0.0
+        elif self._last is not None and now > self._last[0]:
+            elapsed = now - self._last[0]
+            self.bytesPerSecond += self.smoothing * ((bytesDone - self._last[1]) / elapsed - self.bytesPerSecond)
+            self.filesPerSecond += self.smoothing * ((filesDone - self._last[2]) / elapsed - self.filesPerSecond)
+        self._last = (now, bytesDone, filesDone)
+
+        totalBytes = progress.get(job, 'Total bytes')
+        if progress.get_state(job) != 'Running' or not totalBytes or self.bytesPerSecond <= 0:
+            return self.bytesPerSecond, self.filesPerSecond, None
+        return self.bytesPerSecond, self.filesPerSecond, max(0.0, totalBytes - bytesDone) / self.bytesPerSecond
+
+
+class RunMetrics:
+    """
+    How long each phase of a run took (scan, create folders, copy, verify, delete...), with the bytes and files
+    it dealt with, and histograms of how long single files took by their size. write puts them in the
+    Backup logs as JSON, one file per run, and in the Prometheus textfile collector format, one file
+    replaced by each run, to graph from one run to the next.
+    Safe to use from the copying threads.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.written = False  # Once written, the next run starts a new one
+        self.dicPhases = {}  # {phase: {'Seconds': n, 'Bytes': n, 'Files': n}}
+        self.dicHistograms = {}  # {phase: {size bucket: [count for each seconds bucket, then over, total seconds]}}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_phase(self, phase: str) -> dict:
+        return self.dicPhases.setdefault(phase, {'Seconds': 0.0, 'Bytes': 0, 'Files': 0})
+
+    @contextmanager
+    def phase(self, phase: str):
+        """
+        Times what runs inside the with block as part of a phase, adding to any time it already has
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, seconds=time.monotonic() - start)
+
+    def add(self, phase: str, nBytes: int = 0, nFiles: int = 0, seconds: float = 0.0):
+        """
+        Adds to a phase's totals
+        """
+        with self._lock:
+            dicPhase = self._get_phase(phase)
+            dicPhase['Seconds'] += seconds
+            dicPhase['Bytes'] += nBytes
+            dicPhase['Files'] += nFiles
+
+    def clear_phase(self, phase: str):
+        """
+        Forgets a phase, for one that is done again from scratch (scanning again)
+        """
+        with self._lock:
+            self.dicPhases.pop(phase, None)
+            self.dicHistograms.pop(phase, None)
+
+    def time_file(self, phase: str, size: int, seconds: float):
+        """
+        Records one file: adds it to the phase's bytes and files, and to its histogram
+        :param phase: the phase it was part of
+        :param size: its size in bytes
+        :param seconds: how long it took
+        """
+        sizeBucket = next((edge for edge in METRICS_SIZE_BUCKETS if size <= edge), math.inf)
+        secondsBucket = next((i for i, edge in enumerate(METRICS_SECONDS_BUCKETS) if seconds <= edge),
+                             len(METRICS_SECONDS_BUCKETS))
+        with self._lock:
+            dicPhase = self._get_phase(phase)
+            dicPhase['Bytes'] += size
+            dicPhase['Files'] += 1
+            lstCounts = self.dicHistograms.setdefault(phase, {}).setdefault(
+                sizeBucket, [0] * (len(METRICS_SECONDS_BUCKETS) + 1) + [0.0])
+            lstCounts[secondsBucket] += 1
+            lstCounts[-1] += seconds
+
+    def to_dict(self) -> dict:
+        """
+        The metrics as plain data, as written to the JSON file
+        """
+        with self._lock:
+            dicHistograms = {}
+            for phase, dicSizes in self.dicHistograms.items():
+                dicHistograms[phase] = {}
+                for sizeBucket, lstCounts in sorted(dicSizes.items()):
+                    dicHistograms[phase][str(sizeBucket)] = {
+                        'Seconds buckets': dict(zip([str(edge) for edge in METRICS_SECONDS_BUCKETS] + ['inf'],
+                                                    lstCounts[:-1])),
+                        'Count': sum(lstCounts[:-1]),
+                        'Sum': lstCounts[-1]
+                    }
+            return {
+                'Started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'Phases': {phase: dict(dicPhase) for phase, dicPhase in self.dicPhases.items()},
+                'File seconds by size': dicHistograms
+            }
+
+    def to_prometheus(self, dicLabels: dict, state: str = None) -> str:
+        """
+        The metrics in the Prometheus text format
+        :param dicLabels: labels to put on every sample (source etc.), the same from one run to the next
+        :param state: how the run ended, one of PROGRESS_STATES, given as its number
+        """
+        def labels(**extra) -> str:
+            dicAll = {**dicLabels, **extra}
+            return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                             .replace('\n', '\\n')) for key, value in dicAll.items())
+
+        dicData = self.to_dict()
+        lstLines = [f"# HELP {METRICS_PREFIX}_run_start_timestamp_seconds When the run started",
+                    f"# TYPE {METRICS_PREFIX}_run_start_timestamp_seconds gauge",
+                    f"{METRICS_PREFIX}_run_start_timestamp_seconds{{{labels()}}} {self.started}"]
+        if state is not None:
+            lstLines += [f"# HELP {METRICS_PREFIX}_run_state How the run ended: "
+                         + ", ".join(f"{count} {name}" for count, name in enumerate(PROGRESS_STATES)),
+                         f"# TYPE {METRICS_PREFIX}_run_state gauge",
+                         f"{METRICS_PREFIX}_run_state{{{labels()}}} {PROGRESS_STATES.index(state)}"]
+        for key, unit, help in (('Seconds', 'seconds', "Time spent in each phase of the run"),
+                                ('Bytes', 'bytes', "Bytes dealt with in each phase of the run"),
+                                ('Files', 'files', "Files dealt with in each phase of the run")):
+            lstLines.append(f"# HELP {METRICS_PREFIX}_phase_{unit} {help}")
+            lstLines.append(f"# TYPE {METRICS_PREFIX}_phase_{unit} gauge")
+            for phase, dicPhase in dicData['Phases'].items():
+                lstLines.append(f"{METRICS_PREFIX}_phase_{unit}{{{labels(phase=phase)}}} {dicPhase[key]}")
+
+        lstLines.append(f"# HELP {METRICS_PREFIX}_file_seconds Time taken by single files, by size (size_le, bytes)")
+        lstLines.append(f"# TYPE {METRICS_PREFIX}_file_seconds histogram")
+        for phase, dicSizes in dicData['File seconds by size'].items():
+            for sizeBucket, dicHistogram in dicSizes.items():
+                sizeLabel = '+Inf' if sizeBucket == 'inf' else sizeBucket
+                cumulative = 0
+                for edge, count in dicHistogram['Seconds buckets'].items():
+                    cumulative += count
+                    le = '+Inf' if edge == 'inf' else edge
+                    lstLines.append(f"{METRICS_PREFIX}_file_seconds_bucket"
+                                    f"{{{labels(phase=phase, size_le=sizeLabel, le=le)}}} {cumulative}")
+                lstLines.append(f"{METRICS_PREFIX}_file_seconds_sum{{{labels(phase=phase, size_le=sizeLabel)}}} "
+                                f"{dicHistogram['Sum']}")
+                lstLines.append(f"{METRICS_PREFIX}_file_seconds_count{{{labels(phase=phase, size_le=sizeLabel)}}} "
+                                f"{dicHistogram['Count']}")
+        return '\n'.join(lstLines) + '\n'
+
+    def write(self, jsonPath: str, promPath: str, dicInfo: dict):
+        """
+        Writes the metrics as JSON, and in the Prometheus format in place of what's already at promPath.
+        The Prometheus file is written next to it first then moved over it, so a collector reading it
+        never sees it half written (it only reads files ending in .prom).
+        :param jsonPath: JSON file to write
+        :param promPath: Prometheus file to replace
+        :param dicInfo: about the run (source, destinations, state...), added to the JSON, and as labels
+                        in the Prometheus file for those that are strings, apart from 'State' which is a value
+        """
+        with open(jsonPath, 'w', encoding='UTF-8') as file:
+            json.dump({**dicInfo, **self.to_dict()}, file, indent=2)
+        with open(promPath + '.tmp', 'w', encoding='UTF-8') as file:
+            file.write(self.to_prometheus({key.lower(): value for key, value in dicInfo.items()
+                                           if isinstance(value, str) and key != 'State'}, dicInfo.get('State')))
+        os.replace(promPath + '.tmp', promPath)
+        self.written = True
+
+
+class _Resolved:
+    """
+    Stand-in for a Future when a folder is listed on the calling thread
+    """
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+
+class _DestinationWriter(threading.Thread):
+    """
+    Writes the chunks read by BackupJob.copy_files_fan_out to one destination.
+    Messages: ('open', src, dest), ('data', bytes), ('close',), ('abort', error), ('stop',)
+    """
+    def __init__(self, job, pathDest: str, maxChunks: int):
+        super().__init__(daemon=True)
+        self.job = job
+        self.pathDest = pathDest
+        self.queue = queue.Queue(maxsize=maxChunks)
+
+    def put(self, message: tuple):
+        """
+        Hands a message to the writer, waiting while its buffer is full
+        """
+        self.queue.put(message)
+
+    def run(self):
+        fileDest = None
+        src = dest = None
+        error = None
+        while True:
+            message = self.queue.get()
+            kind = message[0]
+            try:
+                if kind == 'open':
+                    src, dest = message[1], message[2]
+                    error = None
+                    self.job.unshare(dest, self.pathDest)
+                    self.job.throttle(0, 1, self.pathDest)
+                elif kind == 'data' and not error:
+                    if fileDest is None:
+                        fileDest = open(dest, 'wb')
+                    fileDest.write(message[1])
+                    self.job.throttle(len(message[1]), 0, self.pathDest)
+                elif kind == 'close' and not error:
+                    if fileDest is None:
+                        fileDest = open(dest, 'wb')  # Empty file
+                    fileDest.close()
+                    shutil.copystat(src, dest)
+                    self.job.set_permissions(dest, self.pathDest, src)
+                    self.job.journal_file('Done', src, self.pathDest)
+            except Exception as e:
+                error = e
+
+            if kind == 'abort':
+                error = message[1]
+            if kind in ('close', 'abort'):
+                if error and fileDest is not None:
+                    # Don't leave a partial file that could pass for a finished one
+                    fileDest.close()
+                    try:
+                        os.remove(dest)
+                    except OSError:
+                        pass
+                fileDest = None
+                self.job.write_log(src, dest, "Copy (fan-out)", error or "", pathDest=self.pathDest)
+            elif kind == 'stop':
+                if fileDest is not None:
+                    fileDest.close()
+                return
+
+
+def find_manifests(pathDest: str) -> list:
+    """
+    The checksum manifests in a destination's Backup logs, oldest first
+    :param pathDest: the root destination path
+    :return: list of manifest paths
+    """
+    pathLogs = os.path.join(pathDest, 'Backup logs')
+    if not os.path.isdir(pathLogs):
+        return []
+    lstManifests = [os.path.join(pathLogs, f) for f in os.listdir(pathLogs) if f.endswith(MANIFEST_SUFFIX)]
+    return sorted(lstManifests, key=os.path.getmtime)
+
+
+def load_manifests(pathDest: str) -> dict:
+    """
+    Reads every manifest of a destination, later runs overriding earlier ones
+    :param pathDest: the root destination path
+    :return: dictionary of {relative path: (size, mtime, checksum as hex)}
+    """
+    dicManifest = {}
+    for manifestPath in find_manifests(pathDest):
+        with open(manifestPath, newline='', encoding='UTF-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Header
+            for relPath, size, mtime, checksum in reader:
+                dicManifest[relPath] = (int(size), float(mtime), checksum)
+    return dicManifest
+
+
+def verify_destination(pathDest: str, threads: int = 2, dropCache: bool = False, cancel=None) -> list:
+    """
+    Checks a destination against its manifests, without needing the source
+    :param pathDest: the root destination path
+    :param threads: files read at once
+    :param dropCache: read from the disk rather than the page cache, see drop_cache
+    :param cancel: optional Event to stop early
+    :return: list of (relative path, problem), empty if everything matched
+    """
+    dicManifest = load_manifests(pathDest)
+    if not dicManifest:
+        raise FileNotFoundError(f"No checksum manifests in {os.path.join(pathDest, 'Backup logs')}")
+
+    def verify_one(item):
+        try:
+            return check_manifest_entry(pathDest, *item, dropCache=dropCache, cancel=cancel)
+        except CopyCancelled:
+            return None
+
+    lstProblems = []
+    items = takewhile(lambda x: cancel is None or not cancel.is_set(), dicManifest.items())
+    for (relPath, entry), problem in imap_threaded(verify_one, items, max(1, threads)):
+        if problem:
+            lstProblems.append((relPath, problem))
+    return sorted(lstProblems)
+
+
+def check_manifest_entry(pathDest: str, relPath: str, entry: tuple, dropCache: bool = False, cancel=None):
+    """
+    Checks one file of a destination against its manifest entry
+    :param pathDest: the root destination path
+    :param relPath: the file's path relative to the destination
+    :param entry: (size, mtime, checksum as hex) from load_manifests
+    :param dropCache: read from the disk rather than the page cache, see drop_cache
+    :param cancel: optional Event, raises CopyCancelled once it is set
+    :return: the problem found, or None if the file matches
+    """
+    size, mtime, checksum = entry
+    dest = os.path.join(pathDest, relPath)
+    try:
+        if os.path.getsize(dest) != size:
+            return "File sizes do not match"
+        if hash_file(dest, dropCache=dropCache, cancel=cancel).hex() != checksum:
+            return "Checksums do not match"
+    except FileNotFoundError:
+        return "Missing"
+    except CopyCancelled:
+        raise
+    except Exception as e:
+        return f"Could not read: {e}"
+    return None
+
+
+def compare_destinations(pathDestA: str, pathDestB: str) -> list:
+    """
+    Cross-checks two destinations using only their manifests, no file is read
+    :return: list of (relative path, problem), empty if the manifests agree
+    """
+    dicA = load_manifests(pathDestA)
+    dicB = load_manifests(pathDestB)
+    for pathDest, dicManifest in ((pathDestA, dicA), (pathDestB, dicB)):
+        if not dicManifest:
+            raise FileNotFoundError(f"No checksum manifests in {os.path.join(pathDest, 'Backup logs')}")
+    lstProblems = []
+    for relPath in sorted(dicA.keys() | dicB.keys()):
+        if relPath not in dicB:
+            lstProblems.append((relPath, f"Only in {pathDestA}"))
+        elif relPath not in dicA:
+            lstProblems.append((relPath, f"Only in {pathDestB}"))
+        elif dicA[relPath][0] != dicB[relPath][0]:
+            lstProblems.append((relPath, "File sizes do not match"))
+        elif dicA[relPath][2] != dicB[relPath][2]:
+            lstProblems.append((relPath, "Checksums do not match"))
+    return lstProblems
+
+
+class Scrubber:
+    """
+    Re-checks a destination against its manifests a slice at a time, to catch files going bad on
+    archives too big to read in one go. Each run checks the files that have gone longest without a check,
+    within a budget of bytes and/or time, so that over enough runs every file is covered.
+    When each file was last checked is kept in the destination's Backup logs, and the results go to a
+    scrub log there in the same CSV format as the job logs.
+    """
+    def __init__(self, pathDest: str):
+        self.pathDest = pathDest
+        self.pathLogs = os.path.join(pathDest, 'Backup logs')
+        self.pathState = os.path.join(self.pathLogs, 'scrub state.sqlite')
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.pathState)
+        connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, checked REAL, ok INTEGER)")
+        return connection
+
+    def run(self, maxBytes: int = 0, maxSeconds: float = 0, threads: int = 2, dropCache: bool = False,
+            cancel=None) -> list:
+        """
+        Checks the next slice of files. The first file is always checked, even if it is over the budget.
+        :param maxBytes: stop before checking more than this, 0 for no limit
+        :param maxSeconds: don't start on another file after this long, 0 for no limit
+        :param threads: files read at once
+        :param dropCache: read from the disk rather than the page cache, see drop_cache
+        :param cancel: optional Event to stop early
+        :return: list of (relative path, problem) found this run
+        """
+        dicManifest = load_manifests(self.pathDest)
+        if not dicManifest:
+            raise FileNotFoundError(f"No checksum manifests in {self.pathLogs}")
+
+        logPath = os.path.join(self.pathLogs, f"Scrub {date.today()}.csv")
+        if not os.path.exists(logPath):
+            with open(logPath, 'w', encoding='UTF-8') as file:
+                csv.writer(file).writerow(["Date", "Time", "Source", "Destination", "Action", "Errors"])
+        log = LogWriter(logPath)
+        cancelled = object()
+
+        def write_log(dest, action, error=""):
+            now = datetime.now()
+            log.write([now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), "-", dest, action, error])
+
+        def check(relPath):
+            try:
+                return check_manifest_entry(self.pathDest, relPath, dicManifest[relPath], dropCache, cancel)
+            except CopyCancelled:
+                return cancelled
+
+        start = time.monotonic()
+
+        def take(lstOrder):
+            used = 0
+            for relPath in lstOrder:
+                size = dicManifest[relPath][0]
+                if used and maxBytes and used + size > maxBytes:
+                    return
+                if maxSeconds and time.monotonic() - start > maxSeconds:
+                    return
+                if cancel is not None and cancel.is_set():
+                    return
+                used += size
+                yield relPath
+
+        connection = self._connect()
+        lstProblems = []
+        countChecked = sizeChecked = 0
+        try:
+            dicChecked = dict(connection.execute("SELECT path, checked FROM files"))
+            # Never checked first, then the longest ago
+            lstOrder = sorted(dicManifest, key=lambda relPath: (dicChecked.get(relPath, 0.0), relPath))
+
+            lstRows = []
+            for relPath, problem in imap_threaded(check, take(lstOrder), max(1, threads)):
+                if problem is cancelled:
+                    continue
+                dest = os.path.join(self.pathDest, relPath)
+                countChecked += 1
+                sizeChecked += dicManifest[relPath][0]
+                if problem:
+                    lstProblems.append((relPath, problem))
+                    write_log(dest, "Scrub", problem)
+                else:
+                    write_log(dest, "Scrub")
+                lstRows.append((relPath, time.time(), not problem))
+                if len(lstRows) >= LOG_BATCH_ROWS:
+                    connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", lstRows)
+                    connection.commit()
+                    lstRows = []
+            connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", lstRows)
+            # Forget files that are no longer in any manifest
+            connection.executemany("DELETE FROM files WHERE path = ?",
+                                   ((relPath,) for relPath in dicChecked if relPath not in dicManifest))
+            connection.commit()
+            countNever = len(dicManifest) - connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            write_log(self.pathDest, f"Scrubbed {countChecked} files ({BackupJob.human_readable(sizeChecked)}), "
+                                     f"{len(lstProblems)} problems, {countNever} files never checked")
+        finally:
+            connection.close()
+            log.close()
+        return sorted(lstProblems)
+
+
+class DedupIndex:
+    """
+    Record of the content in a destination, for 'Deduplicate with hardlinks', kept in its Backup logs so
+    later runs (of any job) can link to files copied earlier. Files are recorded by size straight away,
+    but only checksummed once another file of the same size turns up, since a size nobody else has
+    can't be a duplicate. A lookup only goes through the rows of that size with the same checksum or none
+    yet, and those are checked against the file before they're trusted, so a file that has changed or gone
+    since is checksummed again or forgotten.
+    Only to be used from one thread.
+    """
+    def __init__(self, pathDest: str):
+        self.pathDest = pathDest
+        self.connection = sqlite3.connect(os.path.join(pathDest, 'Backup logs', 'dedup index.sqlite'))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS content "
+                                "(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash BLOB)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS content_size_hash ON content (size, hash)")
+
+    def sizes(self) -> set:
+        """
+        Every file size in the destination, to tell which files could have a copy there already
+        """
+        return {size for size, in self.connection.execute("SELECT DISTINCT size FROM content")}
+
+    def find(self, size: int, digest: bytes, exclude: str = None, cancel=None):
+        """
+        Looks for a file in the destination with this content.
+        :param size: size of the content
+        :param digest: its BLAKE2b checksum
+        :param exclude: a destination path not to count (the file about to be replaced)
+        :param cancel: optional Event, raises CopyCancelled once set
+        :return: path of a file in the destination with the same content, or None
+        """
+        # Rows checksummed already with something else are left out, those not checksummed yet are done once
+        lstRows = self.connection.execute("SELECT path, mtime, hash FROM content "
+                                          "WHERE size = ? AND (hash = ? OR hash IS NULL)", (size, digest))
+        for relPath, mtime, checksum in lstRows.fetchall():
+            path = os.path.join(self.pathDest, relPath)
+            if path == exclude:
+                continue
+            try:
+                stats = os.stat(path)
+                if stats.st_size != size:
+                    raise FileNotFoundError(path)
+                if checksum is None or stats.st_mtime != mtime:
+                    checksum = hash_file(path, cancel=cancel)
+                    self.add(relPath, size, stats.st_mtime, checksum)
+            except CopyCancelled:
+                raise
+            except OSError:
+                self.connection.execute("DELETE FROM content WHERE path = ?", (relPath,))
+                continue
+            if checksum == digest:
+                return path
+        return None
+
+    def add(self, relPath: str, size: int, mtime: float, digest: bytes = None):
+        """
+        Records a file in the destination
+        :param relPath: its path relative to the destination
+        :param digest: its checksum, None to leave it until it's needed (a checksum already recorded
+            is kept if the size and date modified haven't changed)
+        """
+        self.connection.execute("INSERT INTO content VALUES (?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET "
+                                "hash = CASE WHEN size = excluded.size AND mtime = excluded.mtime "
+                                "THEN COALESCE(excluded.hash, hash) ELSE excluded.hash END, "
+                                "size = excluded.size, mtime = excluded.mtime", (relPath, size, mtime, digest))
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class ScanIndex:
+    """
+    On-disk record of every folder listing from previous scans, keyed by the folder's mtime.
+    A folder's mtime changes when entries are added, removed or renamed in it, but not when a file
+    inside is rewritten in place, so only the names of a reused listing are trusted and its files
+    are stat'ed again, see BackupJob._list_directory.
+    """
+    def __init__(self, pathIndex: str = None):
+        if pathIndex is None:
+            pathIndex = os.path.join(PATH_APP_DATA, 'scan index.sqlite')
+        self.pathIndex = pathIndex
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.pathIndex), exist_ok=True)
+        connection = sqlite3.connect(self.pathIndex)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS folders "
+            "(root TEXT, path TEXT, mtime_ns INTEGER, listing TEXT, PRIMARY KEY (root, path))"
+        )
+        return connection
+
+    def load(self, root: str) -> dict:
+        """
+        Reads the listings recorded under a source
+        :param root: the source folder
+        :return: dictionary of {folder path: (mtime_ns, (subfolders, files, is empty))}
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT path, mtime_ns, listing FROM folders WHERE root = ?", (root,))
+            return {path: (mtime, tuple(json.loads(listing))) for path, mtime, listing in rows}
+        finally:
+            connection.close()
+
+    def save(self, root: str, dicBefore: dict, dicAfter: dict, setWalked: set):
+        """
+        Writes back only the listings that changed, and forgets folders that weren't walked this time
+        :param root: the source folder
+        :param dicBefore: the index as loaded
+        :param dicAfter: the index after the scan
+        :param setWalked: the folders the scan went through
+        """
+        lstChanged = [(root, path, entry[0], json.dumps(entry[1])) for path, entry in dicAfter.items()
+                      if path in setWalked and dicBefore.get(path) is not entry]
+        lstGone = [(root, path) for path in dicBefore if path not in setWalked]
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)", lstChanged)
+                connection.executemany("DELETE FROM folders WHERE root = ? AND path = ?", lstGone)
+        finally:
+            connection.close()
+
+
+class CheckResults:
+    """
+    What a run remembers about the files it copied until they're checked and deleted: the checksum of what
+    was written to each copy, for verify_checksums, and how many checks each file has passed (once per
+    check and destination), for delete_source_files.
+    Kept in sqlite, in memory, or with a memory budget in a temporary file, so it doesn't grow with the
+    number of files like the scan's spilled runs. Safe to use from the copying threads, rows are added in batches.
+    """
+    def __init__(self, onDisk: bool = False):
+        """
+        :param onDisk: keep the results in a temporary file rather than in memory
+        """
+        self.nChecks = 0
+        self._lstDigests = []  # Waiting to be added
+        self._lstPassed = []
+        self._lock = threading.Lock()
+        self._finalizer = None
+        pathResults = ':memory:'
+        if onDisk:
+            pathTemp = tempfile.mkdtemp(prefix='paranoid_archivist_checks_')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, pathTemp, True)
+            pathResults = os.path.join(pathTemp, 'checks.sqlite')
+        self._connection = sqlite3.connect(pathResults, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute("CREATE TABLE digests (dest TEXT PRIMARY KEY, digest BLOB)")
+        self._connection.execute("CREATE TABLE passed (file TEXT PRIMARY KEY, count INTEGER)")
+
+    def _flush(self):
+        # Call with the lock held
+        if self._lstDigests:
+            self._connection.executemany("INSERT OR REPLACE INTO digests VALUES (?, ?)", self._lstDigests)
+            self._lstDigests = []
+        if self._lstPassed:
+            self._connection.executemany("INSERT INTO passed VALUES (?, 1) "
+                                         "ON CONFLICT(file) DO UPDATE SET count = count + 1", self._lstPassed)
+            self._lstPassed = []
+
+    def put_digest(self, dest: str, digest: bytes):
+        """
+        Notes the checksum of what was written to a copy
+        :param dest: destination file path
+        """
+        with self._lock:
+            self._lstDigests.append((dest, digest))
+            if len(self._lstDigests) >= LOG_BATCH_ROWS:
+                self._flush()
+
+    def get_digest(self, dest: str):
+        """
+        :return: the checksum noted for a copy, None if there isn't one
+        """
+        with self._lock:
+            self._flush()
+            row = self._connection.execute("SELECT digest FROM digests WHERE dest = ?", (dest,)).fetchone()
+        return row and row[0]
+
+    def clear_digests(self):
+        with self._lock:
+            self._lstDigests = []
+            self._connection.execute("DELETE FROM digests")
+
+    def start_check(self):
+        """
+        Call before a check goes through the files, then passed for every file that passes in each destination
+        """
+        with self._lock:
+            self._flush()
+            self.nChecks += 1
+
+    def passed(self, file: str):
+        """
+        Notes a file passing the current check in one destination
+        :param file: file path relative to the source
+        """
+        with self._lock:
+            self._lstPassed.append((file,))
+            if len(self._lstPassed) >= LOG_BATCH_ROWS:
+                self._flush()
+
+    def passed_all(self, file: str, nDests: int) -> bool:
+        """
+        Whether a file has passed every check in every one of nDests destinations, False if none were run
+        """
+        with self._lock:
+            self._flush()
+            row = self._connection.execute("SELECT count FROM passed WHERE file = ?", (file,)).fetchone()
+        return self.nChecks > 0 and row is not None and row[0] == self.nChecks * nDests
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+# What a scanned folder is
+DIR_VISIBLE = 1
+DIR_INVISIBLE = 2
+
+# What a scanned file is, a file can be a video as well as visible or invisible
+FILE_VISIBLE = 1
+FILE_INVISIBLE = 2
+FILE_FILTERED = 4
+FILE_OLD_VIDEO = 8
+FILE_VIDEO = 16
+
+
+class FileStore:
+    """
+    Compact table of the scanned folders and files.
+    Each folder path is stored once, each file is the index of its folder plus its (interned) name,
+    with the sizes, dates and categories kept in arrays. Paths are only put together when iterated.
+    Given a memory budget, files past it are spilled to run files on disk, in the order they were added,
+    and read back from there when iterated. Folders always stay in memory.
+    """
+    def __init__(self, memoryBudget: int = 0):
+        self.lstRuns = []
+        self.pathSpill = None
+        self._finalizer = None
+        self.clear(memoryBudget)
+
+    def __getstate__(self):
+        # Spilled runs belong to this process, so a copy sent elsewhere starts empty and scans again
+        if self.lstRuns:
+            return {'memoryBudget': self.memoryBudget}
+        state = self.__dict__.copy()
+        state['_finalizer'] = None
+        return state
+
+    def __setstate__(self, state):
+        if 'lstDirs' not in state:
+            self.lstRuns = []
+            self.pathSpill = None
+            self._finalizer = None
+            self.clear(state['memoryBudget'])
+        else:
+            self.__dict__.update(state)
+
+    def clear(self, memoryBudget: int = None):
+        """
+        Empties the store, deleting any spilled runs
+        :param memoryBudget: bytes the files may take before they are spilled to disk, 0 for no limit,
+                             None to keep the current one
+        """
+        if memoryBudget is not None:
+            self.memoryBudget = memoryBudget
+        if self._finalizer is not None:
+            self._finalizer()
+        self.lstRuns = []
+        self.pathSpill = None
+        self._finalizer = None
+        self.countSpilled = 0  # Files before this index are on disk
+
+        self.lstDirs = []
+        self.dicDirIndex = {}
+        self.arrDirFlags = array('B')
+        self.arrDirFirstFile = array('q')  # Files of a folder are added together, so are contiguous
+        self.arrDirFileCount = array('I')
+        self.arrDirAtimes = array('d')  # NaN until the scan has been into the folder
+        self.arrDirMtimes = array('d')
+        self.arrFlagCounts = array('q', [0] * 256)  # Totals for each combination of flags
+        self.arrFlagSizes = array('q', [0] * 256)
+        self._clear_files()
+
+    def _clear_files(self):
+        self.arrFileDirs = array('I')
+        self.lstFileNames = []
+        self.arrFileSizes = array('q')
+        self.arrFileMtimes = array('d')
+        self.arrFileFlags = array('B')
+        self._memoryUsed = 0
+
+    def __len__(self) -> int:
+        return self.countSpilled + len(self.lstFileNames)
+
+    def add_folder(self, path: str, flags: int = 0) -> int:
+        """
+        Adds a folder, or adds flags to one already there
+        :param path: folder path
+        :param flags: DIR_ flags, 0 for a folder that is only there to hold files (like the source)
+        :return: the folder's index
+        """
+        index = self.dicDirIndex.get(path)
+        if index is None:
+            index = len(self.lstDirs)
+            self.lstDirs.append(path)
+            self.dicDirIndex[path] = index
+            self.arrDirFlags.append(flags)
+            self.arrDirFirstFile.append(-1)
+            self.arrDirFileCount.append(0)
+            self.arrDirAtimes.append(math.nan)
+            self.arrDirMtimes.append(math.nan)
+        else:
+            self.arrDirFlags[index] |= flags
+        return index
+
+    def set_folder_times(self, index: int, atime: float, mtime: float):
+        """
+        Keeps a folder's access time and date modified, as found by the scan
+        """
+        self.arrDirAtimes[index] = atime
+        self.arrDirMtimes[index] = mtime
+
+    def add_file(self, dirIndex: int, name: str, size: int, mtime: float, flags: int):
+        """
+        Adds a file. All the files of a folder must be added one after the other.
+        :param dirIndex: index of its folder from add_folder
+        :param name: file name
+        :param size: size in bytes
+        :param mtime: date modified as a timestamp
+        :param flags: FILE_ flags
+        """
+        if self.arrDirFirstFile[dirIndex] < 0:
+            self.arrDirFirstFile[dirIndex] = len(self)
+        self.arrDirFileCount[dirIndex] += 1
+        self.arrFileDirs.append(dirIndex)
+        self.lstFileNames.append(sys.intern(name))
+        self.arrFileSizes.append(size)
+        self.arrFileMtimes.append(mtime)
+        self.arrFileFlags.append(flags)
+        self.arrFlagCounts[flags] += 1
+        self.arrFlagSizes[flags] += size
+
+        if self.memoryBudget:
+            self._memoryUsed += STORE_BYTES_PER_FILE + len(name)
+            if self._memoryUsed > self.memoryBudget:
+                self.spill()
+
+    def spill(self):
+        """
+        Writes the files held in memory to a new run file and frees them
+        """
+        if not self.lstFileNames:
+            return
+        if self.pathSpill is None:
+            self.pathSpill = tempfile.mkdtemp(prefix='paranoid_archivist_scan_')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.pathSpill, True)
+        runPath = os.path.join(self.pathSpill, f"run{len(self.lstRuns):05d}")
+        with open(runPath, 'wb', buffering=COPY_CHUNK) as run:
+            for dirIndex, name, size, mtime, flags in zip(self.arrFileDirs, self.lstFileNames, self.arrFileSizes,
+                                                          self.arrFileMtimes, self.arrFileFlags):
+                bName = os.fsencode(name)
+                run.write(SPILL_RECORD.pack(dirIndex, size, mtime, flags, len(bName)))
+                run.write(bName)
+        self.lstRuns.append(runPath)
+        self.countSpilled += len(self.lstFileNames)
+        self._clear_files()
+
+    @staticmethod
+    def _read_run(runPath: str):
+        """
+        Yields (dirIndex, name, size, mtime, flags) from a spilled run
+        """
+        recordSize = SPILL_RECORD.size
+        with open(runPath, 'rb', buffering=COPY_CHUNK) as run:
+            while True:
+                record = run.read(recordSize)
+                if not record:
+                    return
+                dirIndex, size, mtime, flags, nameLength = SPILL_RECORD.unpack(record)
+                yield dirIndex, os.fsdecode(run.read(nameLength)), size, mtime, flags
+
+    def save(self, filePath: str):
+        """
+        Writes the whole store to a file, to be read back with load (spilled files included)
+        """
+        with open(filePath, 'wb', buffering=COPY_CHUNK) as file:
+            pickle.dump((self.lstDirs, self.arrDirFlags, self.arrDirAtimes, self.arrDirMtimes), file)
+            for dirIndex, name, size, mtime, flags in self._iter_records():
+                bName = os.fsencode(name)
+                file.write(SPILL_RECORD.pack(dirIndex, size, mtime, flags, len(bName)))
+                file.write(bName)
+
+    def load(self, filePath: str):
+        """
+        Replaces the contents of the store with those saved by save, within the current memory budget
+        """
+        self.clear()
+        with open(filePath, 'rb', buffering=COPY_CHUNK) as file:
+            lstDirs, arrDirFlags, arrDirAtimes, arrDirMtimes = pickle.load(file)
+            for path, flags, atime, mtime in zip(lstDirs, arrDirFlags, arrDirAtimes, arrDirMtimes):
+                self.set_folder_times(self.add_folder(path, flags), atime, mtime)
+            recordSize = SPILL_RECORD.size
+            while True:
+                record = file.read(recordSize)
+                if not record:
+                    break
+                dirIndex, size, mtime, flags, nameLength = SPILL_RECORD.unpack(record)
+                self.add_file(dirIndex, os.fsdecode(file.read(nameLength)), size, mtime, flags)
+
+    def _iter_records(self):
+        """
+        Yields (dirIndex, name, size, mtime, flags) for every file, spilled runs first, in the order they were added
+        """
+        for runPath in self.lstRuns:
+            yield from self._read_run(runPath)
+        yield from zip(self.arrFileDirs, self.lstFileNames, self.arrFileSizes, self.arrFileMtimes, self.arrFileFlags)
+
+    def iter_folders(self, mask: int, withTimes: bool = False):
+        """
+        Yields the paths of the folders with any of the given DIR_ flags, in the order they were added
+        :param mask: DIR_ flags to match
+        :param withTimes: yield (path, atime, mtime) rather than just the path, the times are NaN
+                          for folders the scan didn't go into (symlinks)
+        """
+        if withTimes:
+            for path, flags, atime, mtime in zip(self.lstDirs, self.arrDirFlags, self.arrDirAtimes, self.arrDirMtimes):
+                if flags & mask:
+                    yield path, atime, mtime
+        else:
+            for path, flags in zip(self.lstDirs, self.arrDirFlags):
+                if flags & mask:
+                    yield path
+
+    def iter_files(self, mask: int, withStats: bool = False):
+        """
+        Yields the files with any of the given FILE_ flags, in the order they were added
+        :param mask: FILE_ flags to match
+        :param withStats: yield (path, size, mtime) rather than just the path
+        """
+        lstDirs = self.lstDirs
+        for dirIndex, name, size, mtime, flags in self._iter_records():
+            if flags & mask:
+                if withStats:
+                    yield os.path.join(lstDirs[dirIndex], name), size, mtime
+                else:
+                    yield os.path.join(lstDirs[dirIndex], name)
+
+    def iter_names(self, mask: int):
+        """
+        Yields just the names of the files with any of the given FILE_ flags
+        """
+        for dirIndex, name, size, mtime, flags in self._iter_records():
+            if flags & mask:
+                yield name
+
+    def count_files(self, mask: int) -> int:
+        """
+        Number of files with any of the given FILE_ flags
+        """
+        return sum(count for flags, count in enumerate(self.arrFlagCounts) if flags & mask)
+
+    def size_files(self, mask: int) -> int:
+        """
+        Total size of the files with any of the given FILE_ flags
+        """
+        return sum(size for flags, size in enumerate(self.arrFlagSizes) if flags & mask)
+
+    def find(self, filePath: str):
+        """
+        Looks up a file by path among the files still in memory
+        :return: (size, mtime) or None if it isn't in the store, or has been spilled
+        """
+        dirIndex = self.dicDirIndex.get(os.path.dirname(filePath))
+        if dirIndex is None or self.arrDirFirstFile[dirIndex] < 0:
+            return None
+        name = os.path.basename(filePath)
+        first = self.arrDirFirstFile[dirIndex] - self.countSpilled
+        for i in range(max(first, 0), first + self.arrDirFileCount[dirIndex]):
+            if self.lstFileNames[i] == name:
+                return self.arrFileSizes[i], self.arrFileMtimes[i]
+        return None
+
+
 class BackupJob:
     def __init__(self):
         # Options to be set by user
@@ -30,20 +1681,38 @@ class BackupJob:
             'Reset permissions': True,
             'Skip empty folders': True,
             'Copy invisible files': False,
-            'Keep only most recent videos': True
+            'Keep only most recent videos': True,
+            'Reuse previous scan': False,
+            'Only copy new/changed files': False,
+            'Read source once for all destinations': False,
+            'Start copying while scanning': False,
+            'Verify checksums after': False,
+            'Bypass cache when verifying': False,
+            'Deduplicate with hardlinks': False
         }
+        self.dicSettings = {
+            'Scan threads': 1,  # More than 1 lists folders in parallel, for network shares
+            'Fan-out buffer (MB)': 64,  # How far a slow destination may fall behind when reading once
+            'Copy threads': 1,  # More than 1 copies several files at once, for lots of small files
+            'Large file threshold (MB)': 1024,  # Files this big are copied in pieces, with progress as they go
+            'Copy buffer (MB)': 8,  # Size of those pieces, big suits long sequential reads and writes
+            'Scan memory budget (MB)': 0,  # Past this the scanned files are kept on disk, 0 for no limit
+            'Verify threads': 2,  # Files read back at once when verifying checksums
+            'Permissions mode': 777,  # Given to everything copied when resetting permissions, read as octal
+            'Delete threads': 4,  # Source files deleted at once with 'Delete after'
+            'Max MB/s': 0,  # Throttles copying, verifying and deleting, to run in working hours, 0 for no limit
+            'Max files/s': 0
+        }
+        self.dicDestLimits = {}  # {destination: {'Max MB/s': n, 'Max files/s': n}} limits for one destination
         self.lstFilters = []
         self.lstDirsToSkip = []
         self.strLogFileName = False
+        self.dicLogFileNames = {}  # {destination: log file}
+        self._dicLogWriters = {}  # {log file: LogWriter} while a copy is running
+        self._lockLog = threading.Lock()
 
-        # Will sort out all the files and folders into these lists:
-        self.lstDirsVis = []
-        self.lstDirsInvis = []
-        self.lstFilesVis = []
-        self.lstFilesInvis = []
-        self.lstFilesWillSkip = []
-        self.lstVidsToCopy = []
-        self.lstVidsWillSkip = []
+        # Will sort out all the files and folders into here, see the lstDirsVis etc. properties
+        self.store = FileStore()
 
         self.countFiles = 0
         self.sizeFiles = 0
@@ -51,6 +1720,68 @@ class BackupJob:
         # Stuff to use during copy
         self.progCount = 0
         self.progSize = 0
+        self._lockProgress = threading.Lock()
+        self._progress = None  # ProgressBlock of the queue run to report to, and the number of this job in it
+        self._progressIndex = None
+        self._cancel = None  # Event the user sets to cancel
+        self._checks = None  # CheckResults of the latest run, for the checks and deleting after it
+        self._lstCreatedDirs = []  # (destination, folder) made this run, their permissions are set last
+        self._lstClearAcls = []  # (destination, path) made this run, for chmod -N on macOS
+        self._setDedupDests = set()  # Destinations with a dedup index, where files may be hardlinked
+        self._journal = None  # Journal of the queue run, and this job's number in it
+        self._journalJob = None
+        self._setDone = set()  # (destination, file) the journal says a previous run finished
+        self._setInFlight = set()  # (destination, file) a previous run was in the middle of
+        self._dicSizeDone = {}  # {destination: bytes} the previous run finished
+        self._limits = None  # LimitBlock the GUI can change the limits through while running, see copy_files
+        self._dicBuckets = {}  # {destination, or None for the whole job: (bytes bucket, files bucket)}
+        self.metrics = RunMetrics()  # Of the latest scan and run, see write_metrics
+
+    def __getstate__(self):
+        # Locks can't be pickled to send the job to another process
+        state = self.__dict__.copy()
+        del state['_lockLog']
+        del state['_lockProgress']
+        state['_dicLogWriters'] = {}
+        state['_dicBuckets'] = {}
+        state['_limits'] = None
+        state['_checks'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lockLog = threading.Lock()
+        self._lockProgress = threading.Lock()
+
+    # The scanned folders and files as lists, built from the store each time.
+    # Inside this class prefer the store's iterators, these make a new list on every call.
+    @property
+    def lstDirsVis(self) -> list:
+        return list(self.store.iter_folders(DIR_VISIBLE))
+
+    @property
+    def lstDirsInvis(self) -> list:
+        return list(self.store.iter_folders(DIR_INVISIBLE))
+
+    @property
+    def lstFilesVis(self) -> list:
+        return list(self.store.iter_files(FILE_VISIBLE))
+
+    @property
+    def lstFilesInvis(self) -> list:
+        return list(self.store.iter_files(FILE_INVISIBLE))
+
+    @property
+    def lstFilesWillSkip(self) -> list:
+        return list(self.store.iter_names(FILE_FILTERED))
+
+    @property
+    def lstVidsToCopy(self) -> list:
+        return list(self.store.iter_files(FILE_VIDEO))
+
+    @property
+    def lstVidsWillSkip(self) -> list:
+        return list(self.store.iter_files(FILE_OLD_VIDEO))
 
     def set_source(self, src: str):
         """
@@ -103,6 +1834,27 @@ class BackupJob:
                 raise ValueError(f"{folder} is not in the list of copy destinatons.")
             else:
                 self.lstPathDest.remove(folder)
+                self.dicDestLimits.pop(folder, None)
+
+    def set_destination_limits(self, dest: str, dicLimits: dict):
+        """
+        Throttles one destination on top of the job's own 'Max MB/s' and 'Max files/s'
+        :param dest: one of the destinations
+        :param dicLimits: {'Max MB/s': n, 'Max files/s': n}, 0 or missing for no limit
+        """
+        if dest not in self.lstPathDest:
+            raise ValueError(f"{dest} is not in the list of copy destinatons.")
+        unknown = set(dicLimits) - set(LIMIT_SETTINGS)
+        if unknown:
+            raise ValueError(f"Unexpected limit parameters:{unknown}")
+        self.dicDestLimits[dest] = {limit: int(dicLimits.get(limit, 0)) for limit in LIMIT_SETTINGS}
+
+    def get_destination_limits(self, dest: str) -> dict:
+        """
+        Getter for one destination's limits, see set_destination_limits
+        :return: {'Max MB/s': n, 'Max files/s': n}
+        """
+        return self.dicDestLimits.get(dest, {limit: 0 for limit in LIMIT_SETTINGS})
 
     def get_destinations(self) -> list:
         """
@@ -131,6 +1883,30 @@ class BackupJob:
         """
         return self.dicOpts
 
+    def set_settings(self, dicSettings):
+        """
+        Setter for the numeric settings dictionary
+        :param dicSettings: a dictionary of settings, may contain only some of them
+        """
+        unknown = set(dicSettings) - set(self.dicSettings)
+        if unknown:
+            raise ValueError(f"Unexpected setting parameters:{unknown}")
+        for setting, value in dicSettings.items():
+            if not isinstance(value, type(self.dicSettings[setting])):
+                raise ValueError(f"{setting} should be of type {type(self.dicSettings[setting]).__name__}")
+            if value < SETTING_MINIMUMS.get(setting, 0):
+                raise ValueError(f"{setting} should be at least {SETTING_MINIMUMS.get(setting, 0)}, not {value}")
+            if setting == 'Permissions mode' and (set(str(value)) - set('01234567') or value > 7777):
+                raise ValueError(f"{setting} should be an octal mode like 777, not {value}")
+            self.dicSettings[setting] = value
+
+    def get_settings(self) -> dict:
+        """
+        Getter for the numeric settings dictionary
+        :return: a dictionary of settings
+        """
+        return self.dicSettings
+
     def add_dirs_to_skip(self, folders):
         """
         Adds a folder to exclude from the copy.
@@ -239,31 +2015,47 @@ class BackupJob:
         return os.path.splitext(filePath)[1].lower()
 
     @staticmethod
-    def choose_files(lstFiles: list) -> tuple:
+    def choose_files(lstFiles: list, dicMtimes: dict = None) -> tuple:
         """
         Chooses the most recent files from a list of file paths.
         :param lstFiles: a list of file paths
+        :param dicMtimes: optional {path: mtime} from the scan, saves stat-ing every file again
         :return: a tuple containing (list of files to keep, list of files to lose]
         """
-        if len(lstFiles) == 1:  # If only one file, return it.
-            return(lstFiles[0])
+        if len(lstFiles) == 1:  # If only one file, keep it.
+            return lstFiles, []
 
-        # Sort the files by date modifed
-        lstDateModified = [date.fromtimestamp(os.path.getmtime(x)) for x in lstFiles]
-        sorted(lstDateModified, reverse=True)
-        sorted(lstFiles, key=os.path.getmtime, reverse=True)
-        mostRecentDate = max(lstDateModified)
+        getMtime = dicMtimes.get if dicMtimes else os.path.getmtime
+        dicDates = {x: date.fromtimestamp(getMtime(x)) for x in lstFiles}
+        mostRecentDate = max(dicDates.values())
         lstFilesToKeep = []
         lstFilesToLose = []
 
         for file in lstFiles:
-            if date.fromtimestamp(os.path.getmtime(file)) == mostRecentDate:
+            if dicDates[file] == mostRecentDate:
                 lstFilesToKeep.append(file)
             else:
                 lstFilesToLose.append(file)
 
         return lstFilesToKeep, lstFilesToLose
 
+    @staticmethod
+    def files_match(src: str, dest: str) -> bool:
+        """
+        Checks whether the destination already holds a copy of the source, going by size and
+        date modified (which shutil.copy2 preserves)
+        :param src: source file path
+        :param dest: destination file path
+        :return: True if the destination looks up to date
+        """
+        try:
+            srcStats = os.stat(src)
+            destStats = os.stat(dest)
+        except OSError:
+            return False
+        return (srcStats.st_size == destStats.st_size
+                and abs(srcStats.st_mtime - destStats.st_mtime) < MTIME_TOLERANCE)
+
     @staticmethod
     def human_readable(noOfBytes: int) -> str:
         """
@@ -285,10 +2077,131 @@ class BackupJob:
         noOfBytes = round(noOfBytes, 2)
         return f"{noOfBytes} {labels[n]}"
 
-    def get_file_list(self, recalculate: bool = False) -> list:
+    @staticmethod
+    def _stat_file(dirPath: str, name: str) -> tuple:
+        """
+        (name, size, mtime) of a file in a folder, following symlinks like os.scandir's stat
+        """
+        try:
+            stats = os.stat(os.path.join(dirPath, name))
+            return name, stats.st_size, stats.st_mtime
+        except OSError:
+            # Broken symlink or vanished file, os.walk would still list it
+            return name, 0, 0.0
+
+    @staticmethod
+    def _list_directory(dirPath: str, setDirsToSkip: set, lstFilters: list, dicIndex: dict = None):
+        """
+        Lists a folder once with os.scandir, keeping the stat data the scan needs.
+        Subfolders excluded by the user or by the file type filters are left out.
+        :param dirPath: the folder to list
+        :param setDirsToSkip: set of folder paths to exclude
+        :param lstFilters: list of file types to exclude
+        :param dicIndex: optional scan index {folder path: (mtime_ns, listing)}, the listing's names are
+                         reused if the folder's mtime hasn't changed (its files are stat'ed again, they can
+                         be rewritten in place without changing it) and replaced if it has
+        :return: tuple of (dirPath, [(subfolder name, is symlink)], [(file name, size, mtime)], is empty,
+                 (folder's access time, folder's date modified)) or None if the folder can't be listed
+        """
+        try:
+            # Stat before listing, so a change during the listing forces a rescan next time
+            dirStats = os.stat(dirPath)
+            times = (dirStats.st_atime, dirStats.st_mtime)
+            if dicIndex is not None:
+                mtime = dirStats.st_mtime_ns
+                cached = dicIndex.get(dirPath)
+                if cached and cached[0] == mtime:
+                    lstRawDirs, lstCachedFiles, isEmpty = cached[1]
+                    lstFiles = [BackupJob._stat_file(dirPath, name) for name, size, mtimeFile in lstCachedFiles]
+                    if lstFiles != [tuple(x) for x in lstCachedFiles]:
+                        dicIndex[dirPath] = (mtime, (lstRawDirs, lstFiles, isEmpty))
+                    return (dirPath, [x for x in lstRawDirs if os.path.join(dirPath, x[0]) not in setDirsToSkip
+                                      and BackupJob.extension(x[0]) not in lstFilters], lstFiles, isEmpty, times)
+            with os.scandir(dirPath) as it:
+                entries = list(it)
+        except OSError:
+            # os.walk skips folders it can't list, so do we
+            return None
+
+        lstRawDirs = []
+        lstFiles = []
+        for entry in entries:
+            try:
+                isDir = entry.is_dir()
+            except OSError:
+                isDir = False
+            if isDir:
+                lstRawDirs.append((entry.name, entry.is_symlink()))
+            else:
+                try:
+                    stats = entry.stat()
+                    lstFiles.append((entry.name, stats.st_size, stats.st_mtime))
+                except OSError:
+                    # Broken symlink or vanished file, os.walk would still list it
+                    lstFiles.append((entry.name, 0, 0.0))
+
+        if dicIndex is not None:
+            dicIndex[dirPath] = (mtime, (lstRawDirs, lstFiles, not entries))
+
+        lstDirs = [x for x in lstRawDirs if os.path.join(dirPath, x[0]) not in setDirsToSkip
+                   and BackupJob.extension(x[0]) not in lstFilters]
+        return dirPath, lstDirs, lstFiles, not entries, times
+
+    def walk_source(self, root: str = None, prune: bool = True, dicIndex: dict = None):
+        """
+        Walks a tree top-down in the same order as os.walk, listing each folder exactly once.
+        Subfolders are listed one level ahead so their emptiness comes from their own listing.
+        With more than one 'Scan threads', folders are handed to a pool of workers as soon as they
+        are found, while the results are still yielded in the same order as a single thread.
+        Symlinked folders are reported but not followed, as with os.walk.
+        :param root: folder to walk, defaults to the source
+        :param prune: leave out the folders to skip and those matching the file type filters
+        :param dicIndex: optional scan index, see _list_directory
+        Yields tuples of (folder path, [(subfolder name, is empty)], [(file name, size, mtime)],
+        (folder's access time, folder's date modified))
+        """
+        if root is None:
+            root = self.pathSource
+        if prune:
+            listDir = partial(self._list_directory, setDirsToSkip=set(self.lstDirsToSkip), lstFilters=self.lstFilters,
+                              dicIndex=dicIndex)
+        else:
+            listDir = partial(self._list_directory, setDirsToSkip=set(), lstFilters=[], dicIndex=dicIndex)
+
+        threads = self.dicSettings['Scan threads']
+        if threads > 1:
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='scan')
+            fetch = partial(executor.submit, listDir)
+        else:
+            executor = None
+            fetch = lambda path: _Resolved(listDir(path))
+
+        def resolve(future):
+            # Queue up the subfolders as soon as a listing arrives so the workers stay busy
+            node = future.result()
+            if node is None:
+                return None
+            dirPath, dirs = node[0], node[1]
+            return node, [None if isLink else fetch(os.path.join(dirPath, name)) for name, isLink in dirs]
+
+        try:
+            rootNode = resolve(fetch(root))
+            stack = [rootNode] if rootNode else []
+            while stack:
+                (dirPath, dirs, files, isEmpty, times), futures = stack.pop()
+                lstChildren = [resolve(f) if f is not None else None for f in futures]
+                # A folder we can't list (or don't follow) isn't known to be empty
+                lstDirs = [(name, child is not None and child[0][3]) for (name, isLink), child in zip(dirs, lstChildren)]
+                yield dirPath, lstDirs, files, times
+                stack += [c for c in lstChildren[::-1] if c is not None]
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_file_list(self, recalculate: bool = False, onFolder=None) -> list:
         """
         Calculates/returns the list of file paths to be copied.
-        Populates the following properties of the BackupJob class:
+        Populates self.store, which the following properties of the BackupJob class read from:
             self.lstDirsVis
             self.lstDirsInvis
             self.lstFilesVis
@@ -296,9 +2209,14 @@ class BackupJob:
             self.lstFilesWillSkip
             self.lstVidsToCopy
             self.lstVidsWillSkip
+        and sets
             self.countFiles
             self.sizeFiles
+        The list is built in memory, so with a 'Scan memory budget (MB)' use scan_source and
+        iter_files_to_copy instead.
         :param recalculate: pass if you want to repopulate the list
+        :param onFolder: optional, called during a recalculation with a list of (path, size, mtime)
+                         of the files to copy from each folder as soon as it has been sorted
         :return: list of files to copy
         """
 
@@ -306,76 +2224,130 @@ class BackupJob:
         if not self.pathSource:
             return self.pathSource
 
-        # Quick return if applicable
-        if not recalculate and (self.lstFilesVis or self.lstFilesInvis):
-            if self.dicOpts['Copy invisible files']:
-                return self.lstFilesVis + self.lstFilesInvis
-            else:
-                return self.lstFilesVis
-        else:
-            # Reset all lists/counters ready to populate anew
-            self.lstDirsVis = []
-            self.lstDirsInvis = []
-            self.lstFilesVis = []
-            self.lstFilesInvis = []
-            self.lstFilesWillSkip = []
-            self.lstVidsToCopy = []
-            self.lstVidsWillSkip = []
-            self.countFiles = 0
-            self.sizeFiles = 0
+        if recalculate or not self.store.count_files(FILE_VISIBLE | FILE_INVISIBLE):
+            self.scan_source(onFolder)
+        return list(self.iter_files_to_copy())
 
-        # The big walk to populate the lists
-        for srcPath, dirs, files in os.walk(self.pathSource):
-            # Exclude directories
-            if self.dicOpts['Skip empty folders']:
-                dirs[:] = [d for d in dirs
-                           if os.path.join(srcPath, d) not in self.lstDirsToSkip
-                           and self.extension(d) not in self.lstFilters
-                           and os.listdir(os.path.join(srcPath, d))]
-            else:
-                dirs[:] = [d for d in dirs
-                           if os.path.join(srcPath, d) not in self.lstDirsToSkip
-                           and self.extension(d) not in self.lstFilters]
+    def scan_source(self, onFolder=None):
+        """
+        Walks the source and sorts everything into self.store, see get_file_list.
+        Past the 'Scan memory budget (MB)' the store spills the files to disk as it goes.
+        How long it takes goes in the 'scan' phase of the metrics.
+        :param onFolder: optional, called with a list of (path, size, mtime) of the files to copy
+                         from each folder as soon as it has been sorted
+        """
+        if not self.pathSource:
+            return
 
-            # Sort remaining directories into visible and invisible
-            for directory in dirs:
+        # Reset the store/counters ready to populate anew
+        self.store.clear(self.dicSettings['Scan memory budget (MB)'] * 2**20)
+        self.countFiles = 0
+        self.sizeFiles = 0
+        if self.metrics.written:
+            self.metrics = RunMetrics()
+        self.metrics.clear_phase('scan')
+        start = time.monotonic()
+
+        # Only list the folders that changed since the last scan of this source
+        if self.dicOpts['Reuse previous scan']:
+            scanIndex = ScanIndex()
+            dicIndex = scanIndex.load(self.pathSource)
+            dicIndexBefore = dict(dicIndex)
+            setWalked = set()
+        else:
+            dicIndex = None
+
+        # The big walk to populate the store, one listing per folder
+        for srcPath, dirs, files, times in self.walk_source(dicIndex=dicIndex):
+            if dicIndex is not None:
+                setWalked.add(srcPath)
+            dirIndex = self.store.add_folder(srcPath)
+            self.store.set_folder_times(dirIndex, *times)
+
+            # Sort directories into visible and invisible
+            for directory, isEmpty in dirs:
+                if isEmpty and self.dicOpts['Skip empty folders']:
+                    continue
                 if directory[0] != '.':
-                    self.lstDirsVis.append(os.path.join(srcPath, directory))
+                    self.store.add_folder(os.path.join(srcPath, directory), DIR_VISIBLE)
                 else:
-                    self.lstDirsInvis.append(os.path.join(srcPath, directory))
-
-            # Exclude file extensions
-            self.lstFilesWillSkip += [f for f in files if self.extension(f) in self.lstFilters]
-            files[:] = [f for f in files if self.extension(f) not in self.lstFilters]
+                    self.store.add_folder(os.path.join(srcPath, directory), DIR_INVISIBLE)
 
             # Sort videos into most recent and old
-            lstVids = [os.path.join(srcPath, x) for x in files if self.extension(x) in ('.mov', '.mp4')]
+            lstVids = [os.path.join(srcPath, f) for f, size, mtime in files
+                       if self.extension(f) in ('.mov', '.mp4') and self.extension(f) not in self.lstFilters]
+            setVidsToCopy = set()
+            setOldVids = set()
             if lstVids:
                 if 'VFX' not in srcPath and self.dicOpts['Keep only most recent videos']:
-                    tupVids = self.choose_files(lstVids)
-                    self.lstVidsToCopy += tupVids[0]
-                    self.lstVidsWillSkip += tupVids[1]
-                    # Remove old vids from file list
-                    files[:] = [f for f in files if os.path.join(srcPath, f) not in tupVids[1]]
+                    dicMtimes = {os.path.join(srcPath, f): mtime for f, size, mtime in files}
+                    tupVids = self.choose_files(lstVids, dicMtimes)
+                    setVidsToCopy = {os.path.basename(x) for x in tupVids[0]}
+                    setOldVids = {os.path.basename(x) for x in tupVids[1]}
                 else:
                     # Keep all videos
-                    self.lstVidsToCopy += lstVids
-
-            # Sort remaining files into visible and invisible and calculate size
-            for file in files:
+                    setVidsToCopy = {os.path.basename(x) for x in lstVids}
+
+            # Sort the files into filtered, old videos, visible and invisible and calculate size
+            lstToCopy = []
+            for file, size, mtime in files:
+                if self.extension(file) in self.lstFilters:
+                    self.store.add_file(dirIndex, file, size, mtime, FILE_FILTERED)
+                    continue
+                if file in setOldVids:
+                    self.store.add_file(dirIndex, file, size, mtime, FILE_OLD_VIDEO)
+                    continue
+                flags = FILE_VIDEO if file in setVidsToCopy else 0
                 if file[0] != '.':
-                    self.lstFilesVis.append(os.path.join(srcPath, file))
-                    self.sizeFiles += os.path.getsize(os.path.join(srcPath, file))
+                    self.store.add_file(dirIndex, file, size, mtime, flags | FILE_VISIBLE)
+                    self.sizeFiles += size
+                    lstToCopy.append((os.path.join(srcPath, file), size, mtime))
                 else:
-                    self.lstFilesInvis.append(os.path.join(srcPath, file))
+                    self.store.add_file(dirIndex, file, size, mtime, flags | FILE_INVISIBLE)
                     if self.dicOpts['Copy invisible files']:
-                        self.sizeFiles += os.path.getsize(os.path.join(srcPath, file))
+                        self.sizeFiles += size
+                        lstToCopy.append((os.path.join(srcPath, file), size, mtime))
+            if onFolder and lstToCopy:
+                onFolder(lstToCopy)
 
-        lstFiles = self.lstFilesVis + self.lstFilesInvis
+        if dicIndex is not None:
+            scanIndex.save(self.pathSource, dicIndexBefore, dicIndex, setWalked)
 
-        self.countFiles = len(lstFiles)
+        self.countFiles = self.store.count_files(FILE_VISIBLE | FILE_INVISIBLE)
+        self.metrics.add('scan', self.sizeFiles, self.countFiles, time.monotonic() - start)
+
+    def load_scan(self, filePath: str):
+        """
+        Reads back a scan saved with FileStore.save instead of scanning again
+        """
+        self.store.clear(self.dicSettings['Scan memory budget (MB)'] * 2**20)
+        self.store.load(filePath)
+        self.countFiles = self.store.count_files(FILE_VISIBLE | FILE_INVISIBLE)
+        self.sizeFiles = self.store.size_files(FILE_VISIBLE | (FILE_INVISIBLE if self.dicOpts['Copy invisible files']
+                                                               else 0))
+
+    def iter_files_to_copy(self, withStats: bool = False):
+        """
+        Iterates over the files to copy without building a list, scanning first if needed
+        :param withStats: yield (path, size, mtime) rather than just the path
+        """
+        if not self.store.count_files(FILE_VISIBLE | FILE_INVISIBLE):
+            self.scan_source()
+        # Visible files first, then invisible ones, like the old lists
+        if self.dicOpts['Copy invisible files']:
+            return chain(self.store.iter_files(FILE_VISIBLE, withStats), self.store.iter_files(FILE_INVISIBLE, withStats))
+        return self.store.iter_files(FILE_VISIBLE, withStats)
 
-        return lstFiles
+    def get_file_size(self, filePath: str) -> int:
+        """
+        Size of a file in the list, from the scan if possible
+        :param filePath: source file path
+        :return: size in bytes
+        """
+        stats = self.store.find(filePath)
+        if stats is None:
+            return os.path.getsize(filePath)
+        return stats[0]
 
     def get_files_count(self, recalculate: bool = False) -> int:
         """
@@ -385,7 +2357,7 @@ class BackupJob:
         :return: integer count of files in the to-copy list.
         """
         if recalculate:
-            self.countFiles = len(self.get_file_list(recalculate=True))
+            self.scan_source()
         return self.countFiles
 
     def get_files_size(self, recalculate: bool = False) -> str:
@@ -395,7 +2367,8 @@ class BackupJob:
         :return: string of human readable file size
         """
         if recalculate:
-            self.sizeFiles = sum([os.path.getsize(x) for x in self.get_file_list(recalculate=True)])
+            self.scan_source()
+            self.sizeFiles = self.store.size_files(FILE_VISIBLE | FILE_INVISIBLE)
         return self.human_readable(self.sizeFiles)
 
     def save_file_lists(self, directory: str):
@@ -421,84 +2394,94 @@ class BackupJob:
         fpVidsToCopy   = filePrefix + 'Videos to copy.csv'
         fpVidsWillSkip = filePrefix + 'Videos to skip.csv'
 
-        self.get_file_list()
-
-        with open(fpDirsVis, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstDirsVis:
-                writer.writerow([i])
-
-        with open(fpDirsInvis, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstDirsInvis:
-                writer.writerow([i])
-
-        with open(fpFilesVis, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstFilesVis:
-                writer.writerow([i])
-
-        with open(fpFilesInvis, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstFilesInvis:
-                writer.writerow([i])
-
-        with open(fpFilesWillSkip, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstFilesWillSkip:
-                writer.writerow([i])
-
-        with open(fpVidsToCopy, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstVidsToCopy:
-                writer.writerow([i])
-
-        with open(fpVidsWillSkip, mode='w') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for i in self.lstVidsWillSkip:
-                writer.writerow([i])
+        if not self.store.count_files(FILE_VISIBLE | FILE_INVISIBLE):
+            self.scan_source()
+
+        for filePath, items in (
+            (fpDirsVis, self.store.iter_folders(DIR_VISIBLE)),
+            (fpDirsInvis, self.store.iter_folders(DIR_INVISIBLE)),
+            (fpFilesVis, self.store.iter_files(FILE_VISIBLE)),
+            (fpFilesInvis, self.store.iter_files(FILE_INVISIBLE)),
+            (fpFilesWillSkip, self.store.iter_names(FILE_FILTERED)),
+            (fpVidsToCopy, self.store.iter_files(FILE_VIDEO)),
+            (fpVidsWillSkip, self.store.iter_files(FILE_OLD_VIDEO))
+        ):
+            with open(filePath, mode='w') as file:
+                writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                for i in items:
+                    writer.writerow([i])
 
     def reproduce_folder_structure(self, destPath):
         """
         Creates the necessary folders in the destinations, preserving date modifieds.
         If destPath does not exist, it will be created.
-        Will call get_file_list first, in order to be able to function.
+        Works from the folders and dates kept by the scan, scanning first if needed.
         """
 
         if not self.pathSource:
             return False
 
-        if not self.get_file_list():
+        if not any(True for x in self.iter_files_to_copy()):
             return False
 
         if self.dicOpts['Copy invisible files']:
-            lstDirs = self.lstDirsVis + self.lstDirsInvis
+            mask = DIR_VISIBLE | DIR_INVISIBLE
         else:
-            lstDirs = self.lstDirsVis
-
-        # Must work from bottom-up to avoid resetting the date-modifieds.
-        # If you go top-down, you change the parent folder's date modified to now every time
-        # you change the child folder's date modified
-        for srcPath, dirs, files in os.walk(self.pathSource, topdown=False):
-            # Exclude directories
-            dirs[:] = [d for d in dirs if os.path.join(srcPath, d) not in self.lstDirsToSkip]
-            if srcPath not in lstDirs:
-                continue
-            dirToMake = os.path.join(destPath, os.path.relpath(srcPath, self.pathSource))
-            if not os.path.isdir(dirToMake):
+            mask = DIR_VISIBLE
+
+        # Only the folders the scan went into, as with the walk this used to do
+        lenSource = len(self.pathSource)
+        lstDirs = [(srcPath, os.path.join(destPath, srcPath[lenSource:].lstrip(os.sep)), (atime, mtime))
+                   for srcPath, atime, mtime in self.store.iter_folders(mask, withTimes=True)
+                   if not math.isnan(mtime)]
+
+        # The scan found parents before their children, so in that order each folder is a single mkdir
+        setCreated = set()
+        for srcPath, dirToMake, times in lstDirs:
+            try:
                 try:
-                    os.makedirs(dirToMake)
-                    self.write_log(srcPath, dirToMake, "Create folder")
-                except Exception as e:
-                    self.write_log(srcPath, dirToMake, "Create folder", e)
-            srcDirStats = os.stat(srcPath)
-            destDirStats = os.stat(dirToMake)
-            if not (srcDirStats.st_atime, srcDirStats.st_mtime) == (destDirStats.st_atime, destDirStats.st_mtime):
+                    os.mkdir(dirToMake)
+                    self.created_folder(dirToMake, destPath)
+                except FileNotFoundError:
+                    # Parent left out of the copy (invisible) or the destination itself not there yet
+                    self.make_folders(dirToMake, destPath)
+                setCreated.add(dirToMake)
+                self.write_log(srcPath, dirToMake, "Create folder", pathDest=destPath)
+            except FileExistsError as e:
+                if not os.path.isdir(dirToMake):
+                    self.write_log(srcPath, dirToMake, "Create folder", e, pathDest=destPath)
+            except Exception as e:
+                self.write_log(srcPath, dirToMake, "Create folder", e, pathDest=destPath)
+
+        # Then the dates, deepest first, in one pass.
+        # Folders just created certainly need them, the others only if they differ from the source
+        for srcPath, dirToMake, times in reversed(lstDirs):
+            if dirToMake not in setCreated:
                 try:
-                    os.utime(dirToMake, (srcDirStats.st_atime, srcDirStats.st_mtime))
-                    self.write_log(srcPath, dirToMake, "Set date modified")
-                except Exception as e:
-                    self.write_log(srcPath, dirToMake, "Set date modified", e)
+                    destDirStats = os.stat(dirToMake)
+                except OSError:
+                    # Couldn't be created, already logged
+                    continue
+                if times == (destDirStats.st_atime, destDirStats.st_mtime):
+                    continue
+            try:
+                os.utime(dirToMake, times)
+                self.write_log(srcPath, dirToMake, "Set date modified", pathDest=destPath)
+            except Exception as e:
+                self.write_log(srcPath, dirToMake, "Set date modified", e, pathDest=destPath)
+
+    def get_devices(self) -> set:
+        """
+        The drives the job reads from and writes to, by st_dev (or the path itself if it can't be reached),
+        for run_queue to tell which jobs can run at the same time
+        """
+        setDevices = set()
+        for path in [self.pathSource] + self.lstPathDest:
+            try:
+                setDevices.add(os.stat(path).st_dev)
+            except (OSError, TypeError):
+                setDevices.add(path)
+        return setDevices
 
     def check_folder_permissions(self) -> bool:
         """
@@ -513,119 +2496,898 @@ class BackupJob:
         if self.sizeFiles == 0:
             raise ValueError("Please calculate size of copy before checking drive space.")
 
-        return [[x, False] if self.sizeFiles > shutil.disk_usage(x).free else [x, True] for x in self.lstPathDest]
+        # When resuming, what's already there doesn't need the space again
+        return [[x, False] if self.sizeFiles - self._dicSizeDone.get(x, 0) > shutil.disk_usage(x).free
+                else [x, True] for x in self.lstPathDest]
 
-    def copy_files(self, progress=None, index=None):
+    def copy_files(self, progress=None, index=None, cancel=None, limits=None):
         """
         Copy the files from the source to the destinations
-        progress and index are used for communicating the progress as a multiprocessing child
-        """
+        progress (a ProgressBlock) and index (this job's number in it) are used for communicating the progress
+        as a multiprocessing child
+        cancel is an optional Event, once set the copy stops after the current piece of the current file
+        limits is an optional LimitBlock with this job's limits and its destinations' at index, read while
+        the copy runs in place of the settings and destination limits so they can be changed
+        """
+
+        # Deduplicating needs the whole list up front and goes one destination at a time,
+        # and a resumed run has its scan already
+        dedup = self.dicOpts['Deduplicate with hardlinks']
+        resuming = bool(self._setDone or self._setInFlight)
+        streaming = self.dicOpts['Start copying while scanning'] and not dedup and not resuming
+
+        # When copying while scanning, the size is only known if the files were analysed beforehand
+        if not streaming or self.sizeFiles:
+            drivesWithoutEnoughSpace = [x[0] for x in self.check_space_on_drive() if not x[1]]
+            if drivesWithoutEnoughSpace:
+                raise IOError(f"Not enough space on the following destinations: {drivesWithoutEnoughSpace[0]}")
+
+        self._progress = progress
+        self._progressIndex = index
+        self._cancel = cancel
+        self._limits = limits
+        self._dicBuckets = {key: tuple(TokenBucket(partial(self.get_limit, limit, key)) for limit in LIMIT_SETTINGS)
+                            for key in [None] + self.lstPathDest}
+        self.new_check_results()
+        self._lstCreatedDirs = []
+        self._lstClearAcls = []
+        self._setDedupDests = {pathDest for pathDest in self.lstPathDest
+                               if os.path.exists(os.path.join(pathDest, 'Backup logs', 'dedup index.sqlite'))}
+        if progress is not None:
+            # Skipped files count as done, so the totals are everything, for every destination
+            countToCopy = self.store.count_files(FILE_VISIBLE | (FILE_INVISIBLE if self.dicOpts['Copy invisible files']
+                                                                 else 0))
+            progress.set(index, 'Total bytes', self.sizeFiles * len(self.lstPathDest))
+            progress.set(index, 'Total files', countToCopy * len(self.lstPathDest))
+            progress.set_state(index, 'Running')
+        state = 'Failed'
+        # A scan since the last run has already started the metrics for this one
+        if self.metrics.written:
+            self.metrics = RunMetrics()
+        metrics = self.metrics
+        start = time.monotonic()
 
-        drivesWithoutEnoughSpace = [x[0] for x in self.check_space_on_drive() if not x[1]]
-        if drivesWithoutEnoughSpace:
-            raise IOError(f"Not enough space on the following destinations: {drivesWithoutEnoughSpace[0]}")
+        try:
+            if streaming:
+                for pathDest in self.lstPathDest:
+                    self.create_log(pathDest)
+                    self.open_log(pathDest)
+                with metrics.phase('copy'):
+                    self.copy_files_streaming()
+                # The rest of the folders and their date modifieds once everything is in them
+                for pathDest in self.lstPathDest:
+                    if not self.is_cancelled():
+                        with metrics.phase('create folders'):
+                            self.reproduce_folder_structure(pathDest)
+                    with metrics.phase('file lists'):
+                        self.save_file_lists(pathDest + '/Backup logs')
+            else:
+                for pathDest in self.lstPathDest:
+                    self.create_log(pathDest)
+                    self.open_log(pathDest)
+                    with metrics.phase('create folders'):
+                        self.reproduce_folder_structure(pathDest)
+                    with metrics.phase('file lists'):
+                        self.save_file_lists(pathDest + '/Backup logs')
+
+                with metrics.phase('copy'):
+                    if (self.dicOpts['Read source once for all destinations'] and len(self.lstPathDest) > 1
+                            and not dedup):
+                        self.copy_files_fan_out()
+                    else:
+                        for pathDest in self.lstPathDest:
+                            self.copy_files_to_destination(pathDest)
 
+            if self.is_cancelled():
+                for pathDest in self.lstPathDest:
+                    self.write_log("-", pathDest, "Job cancelled", pathDest=pathDest)
+                state = 'Cancelled'
+                return
+
+            if self.dicOpts['Reset permissions']:
+                with metrics.phase('permissions'):
+                    self.reset_permissions()
+
+            # The originals are only deleted once the copies have passed a check
+            okayToDelete = None
+            if self.dicOpts['Check sizes after']:
+                with metrics.phase('check sizes'):
+                    okayToDelete = self.check_metadata()
+
+            if self.dicOpts['Verify checksums after']:
+                with metrics.phase('verify'):
+                    okayToDelete = self.verify_checksums() and okayToDelete is not False
+
+            if self.dicOpts['Delete after']:
+                if okayToDelete:
+                    with metrics.phase('delete'):
+                        self.delete_source_files()
+                else:
+                    for pathDest in self.lstPathDest:
+                        self.write_log(self.pathSource, '', "Deleting",
+                                       "Skipped, the copies were not checked" if okayToDelete is None
+                                       else "Skipped, the copies did not pass the checks",
+                                       pathDest=pathDest)
+            state = 'Cancelled' if self.is_cancelled() else 'Done'
+        finally:
+            metrics.add('run', seconds=time.monotonic() - start)
+            self.write_metrics(state)
+            # Whatever happened, get the log rows onto the disk
+            self.close_logs()
+            if progress is not None:
+                progress.set_state(index, state)
+
+    def write_metrics(self, state: str):
+        """
+        Writes the run's metrics (see RunMetrics) to the Backup logs of every destination: JSON named like
+        the file lists with 'metrics.json' on the end, and '{source} metrics.prom' replaced by every run
+        :param state: how the run ended, one of PROGRESS_STATES
+        """
+        source = os.path.basename(self.get_source())
+        jsonName = f"{source} {datetime.fromtimestamp(self.metrics.started).strftime('%Y-%m-%d %H-%M-%S')} metrics.json"
+        dicInfo = {'Source': self.get_source(), 'State': state}
         for pathDest in self.lstPathDest:
-            self.create_log(pathDest)
-            self.reproduce_folder_structure(pathDest)
-            self.save_file_lists(pathDest + '/Backup logs')
-            for src in self.get_file_list():
+            try:
+                self.metrics.write(os.path.join(pathDest, 'Backup logs', jsonName),
+                                   os.path.join(pathDest, 'Backup logs', f"{source} metrics.prom"),
+                                   {**dicInfo, 'Destination': pathDest})
+            except OSError as e:
+                self.write_log("-", pathDest, "Write metrics", e, pathDest=pathDest)
+
+    def is_cancelled(self) -> bool:
+        """
+        Whether the user has asked the running copy to stop
+        """
+        return self._cancel is not None and self._cancel.is_set()
+
+    def get_limit(self, limit: str, pathDest: str = None) -> float:
+        """
+        The current value of a limit, per second and in bytes for 'Max MB/s'
+        :param limit: 'Max MB/s' or 'Max files/s'
+        :param pathDest: a destination for its own limit, None for the job's
+        :return: 0 for no limit
+        """
+        if self._limits is not None:
+            value = self._limits.get(self._progressIndex, limit,
+                                     None if pathDest is None else self.lstPathDest.index(pathDest))
+        elif pathDest is not None:
+            value = self.get_destination_limits(pathDest)[limit]
+        else:
+            value = self.dicSettings[limit]
+        return value * 2**20 if limit == 'Max MB/s' else value
+
+    def byte_limited(self, pathDest: str = None) -> bool:
+        """
+        Whether 'Max MB/s' applies to the job, or to this destination
+        """
+        return self.get_limit('Max MB/s') > 0 or (pathDest is not None and self.get_limit('Max MB/s', pathDest) > 0)
+
+    def throttle(self, nBytes: int, nFiles: int = 0, pathDest: str = None):
+        """
+        Waits as long as 'Max MB/s' and 'Max files/s' need before going on, for the job and for the destination.
+        Safe to call from the copying threads.
+        :param nBytes: bytes about to be (or just) read or written
+        :param nFiles: files about to be copied, checked or deleted
+        :param pathDest: the root destination path, None for work that isn't on a destination
+        """
+        for key in {None, pathDest}:
+            buckets = self._dicBuckets.get(key)
+            if buckets is None:
+                continue
+            if nBytes:
+                buckets[0].take(nBytes, self._cancel)
+            if nFiles:
+                buckets[1].take(nFiles, self._cancel)
+
+    def report_progress(self, nBytes: int, nFiles: int = 0, pathDest: str = None):
+        """
+        Adds to the progress counters and passes them on to the run's ProgressBlock.
+        Safe to call from the copying threads.
+        :param nBytes: bytes copied (or skipped) since the last report
+        :param nFiles: files finished since the last report
+        :param pathDest: the destination they went to, for its own counters
+        """
+        with self._lockProgress:
+            self.progSize += nBytes
+            self.progCount += nFiles
+            if self._progress is not None:
+                self._progress.set(self._progressIndex, 'Bytes', self.progSize)
+                self._progress.set(self._progressIndex, 'Files', self.progCount)
+                if pathDest in self.lstPathDest:
+                    destIndex = self.lstPathDest.index(pathDest)
+                    self._progress.add(self._progressIndex, 'Bytes', nBytes, destIndex)
+                    self._progress.add(self._progressIndex, 'Files', nFiles, destIndex)
+
+    def report_current_file(self, src: str):
+        """
+        Passes the file being copied on to the run's ProgressBlock. Safe to call from the copying threads.
+        """
+        if self._progress is not None:
+            with self._lockProgress:
+                self._progress.set_current_file(self._progressIndex, src)
+
+    def set_journal(self, journal, jobNumber: int = None, setDone: set = None, setInFlight: set = None):
+        """
+        Has the copy record what it does in a queue run's Journal, and skip what a previous run finished.
+        :param journal: the Journal, None to stop journalling
+        :param jobNumber: this job's number in the queue
+        :param setDone: (destination, file relative to the source) the previous run finished
+        :param setInFlight: (destination, file) the previous run was copying when it stopped, these are
+                            copied again whatever 'Only copy new/changed files' makes of them
+        """
+        self._journal = journal
+        self._journalJob = jobNumber
+        self._setDone = setDone or set()
+        self._setInFlight = setInFlight or set()
+        self._dicSizeDone = {}
+        if self._setDone:
+            for src, size, mtime in self.iter_files_to_copy(withStats=True):
                 file = os.path.relpath(src, self.pathSource)
-                dest = os.path.join(pathDest, file)
+                for pathDest in self.lstPathDest:
+                    if (pathDest, file) in self._setDone:
+                        self._dicSizeDone[pathDest] = self._dicSizeDone.get(pathDest, 0) + size
+
+    def journal_file(self, kind: str, src: str, pathDest: str):
+        """
+        Adds a row to the journal, if there is one. Safe to call from the copying threads.
+        A 'Done' copy is synced first, in the calling thread so that copies are synced in parallel.
+        :param kind: 'Started' or 'Done'
+        :param src: source file path
+        :param pathDest: the root destination path
+        """
+        if self._journal is not None:
+            # A copy that can't be synced isn't counted as done, a resumed run copies it again
+            if kind == 'Done' and not sync_file(os.path.join(pathDest, os.path.relpath(src, self.pathSource))):
+                return
+            self._journal.write([kind, self._journalJob, pathDest, os.path.relpath(src, self.pathSource)])
+
+    def done_before(self, src: str, pathDest: str) -> bool:
+        """
+        Whether the journal of a previous run says this file was finished in this destination
+        """
+        return bool(self._setDone) and (pathDest, os.path.relpath(src, self.pathSource)) in self._setDone
+
+    def copy_files_to_destination(self, pathDest: str):
+        """
+        Copy the files from the source to one destination.
+        With more than one 'Copy threads', several files are copied at once.
+        :param pathDest: the root destination path
+        """
+        countSkipped = 0
+        sizeSkipped = 0
+        copyOne = lambda item: self.copy_file_to_destination(item[0], pathDest, item[1])
+        lstFiles = takewhile(lambda x: not self.is_cancelled(), self.iter_files_to_copy(withStats=True))
+        index = None
+        if self.dicOpts['Deduplicate with hardlinks']:
+            index = DedupIndex(pathDest)
+            self._setDedupDests.add(pathDest)
+            lstLinks = []  # (source, size, mtime, checksum, destination, file there with the same content)
+            dicDigests = {}  # {source: checksum} for the files checksummed to look for duplicates
+            lstFiles = self.deduplicate(lstFiles, pathDest, index, lstLinks, dicDigests)
+        if self.dicSettings['Copy threads'] > 1:
+            results = imap_threaded(copyOne, lstFiles, self.dicSettings['Copy threads'])
+        else:
+            results = ((item, copyOne(item)) for item in lstFiles)
+
+        try:
+            for (src, size, mtime), copied in results:
+                if not copied:
+                    # One summary row for these rather than one each
+                    countSkipped += 1
+                    sizeSkipped += size
+                if index is not None:
+                    index.add(os.path.relpath(src, self.pathSource), size, mtime, dicDigests.pop(src, None))
+            if index is not None:
+                with self.metrics.phase('hardlinks'):
+                    countLinked, sizeLinked = self.link_duplicates(lstLinks, pathDest, index)
+                countSkipped += countLinked
+                sizeSkipped += sizeLinked
+        finally:
+            if index is not None:
+                index.close()
+        if self.dicOpts['Only copy new/changed files']:
+            self.write_log(self.pathSource, pathDest,
+                           f"Skipped {countSkipped} unchanged files ({self.human_readable(sizeSkipped)})",
+                           pathDest=pathDest)
+
+    def copy_file_to_destination(self, src: str, pathDest: str, size: int = None) -> bool:
+        """
+        Copy one file from the source to the same place in a destination.
+        Files over 'Large file threshold (MB)' are copied in pieces, reporting progress as they go,
+        as are files over 'Copy buffer (MB)' when there's a limit on MB/s, so they don't go in one burst.
+        :param src: source file path
+        :param pathDest: the root destination path
+        :param size: size of the file from the scan (optional, looked up if not given)
+        :return: False if the file was skipped as unchanged
+        """
+        file = os.path.relpath(src, self.pathSource)
+        dest = os.path.join(pathDest, file)
+        if size is None:
+            size = self.get_file_size(src)
+        if self.done_before(src, pathDest):
+            self.report_progress(size, 1, pathDest)
+            return False
+        if (self.dicOpts['Only copy new/changed files'] and (pathDest, file) not in self._setInFlight
+                and self.files_match(src, dest)):
+            self.journal_file('Done', src, pathDest)
+            self.report_progress(size, 1, pathDest)
+            return False
+
+        self.report_current_file(src)
+        start = time.monotonic()
+        reported = 0
+        self.unshare(dest, pathDest)
+        self.journal_file('Started', src, pathDest)
+        bufferSize = self.dicSettings['Copy buffer (MB)'] * 2**20
+        inPieces = (size >= self.dicSettings['Large file threshold (MB)'] * 2**20
+                    or (size > bufferSize and self.byte_limited(pathDest)))
+        self.throttle(0 if inPieces else size, 1, pathDest)
+
+        def on_piece(n):
+            nonlocal reported
+            reported += n
+            self.report_progress(n, 0, pathDest)
+            self.throttle(n, 0, pathDest)
+
+        try:
+            if self.dicOpts['Verify checksums after']:
+                # Checksum the source as it goes past rather than reading it again afterwards
+                hasher = hashlib.blake2b()
+                if inPieces:
+                    backend = copy_file_chunked(src, dest, bufferSize, on_piece, self._cancel, hasher)
+                else:
+                    backend = copy_file_chunked(src, dest, COPY_CHUNK, hasher=hasher)
+                self._checks.put_digest(dest, hasher.digest())
+            elif inPieces:
+                backend = copy_file_chunked(src, dest, bufferSize, on_piece, self._cancel)
+            else:
+                backend = copy_file_fast(src, dest)
+            self.write_log(src, dest, f"Copy ({backend})", pathDest=pathDest)
+            self.set_permissions(dest, pathDest, src)
+            self.journal_file('Done', src, pathDest)
+            self.metrics.time_file('copy', size, time.monotonic() - start)
+        except CopyCancelled:
+            # Don't leave a partial file that could pass for a finished one
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+            self.write_log(src, dest, "Copy cancelled", pathDest=pathDest)
+            return True
+        except Exception as e:
+            self.write_log(src, dest, "Copy", e, pathDest=pathDest)
+        self.report_progress(size - reported, 1, pathDest)
+        return True
+
+    def deduplicate(self, lstFiles, pathDest: str, index: DedupIndex, lstLinks: list, dicDigests: dict):
+        """
+        Passes on the files to copy to a destination, holding back those whose content is already there
+        (from an earlier run, see DedupIndex) or is copied there earlier in this run. Those are added to
+        lstLinks for link_duplicates to hardlink once the copies are done.
+        Only files that share their size with another file can be duplicates, so only they are checksummed.
+        :param lstFiles: (source, size, mtime) of the files to copy
+        :param pathDest: the root destination path
+        :param index: the destination's DedupIndex
+        :param lstLinks: list to add (source, size, mtime, checksum, destination, existing file) to
+        :param dicDigests: dict to add {source: checksum} to for the files checksummed and still to copy
+        :return: generator of (source, size, mtime) still to copy
+        """
+        counterSizes = Counter(size for src, size, mtime in self.iter_files_to_copy(withStats=True))
+        setIndexSizes = index.sizes()
+        dicFirst = {}  # {(size, checksum): destination} for the content copied this run
+        for src, size, mtime in lstFiles:
+            dest = os.path.join(pathDest, os.path.relpath(src, self.pathSource))
+            if (not size or (counterSizes[size] < 2 and size not in setIndexSizes) or self.done_before(src, pathDest)
+                    or (self.dicOpts['Only copy new/changed files'] and self.files_match(src, dest))):
+                yield src, size, mtime
+                continue
+            start = time.monotonic()
+            try:
+                digest = hash_file(src, cancel=self._cancel, callback=self.throttle)
+                self.metrics.time_file('dedup checksums', size, time.monotonic() - start)
+                existing = dicFirst.get((size, digest)) or index.find(size, digest, dest, self._cancel)
+            except CopyCancelled:
+                return
+            except Exception:
+                # Leave it to the copy to fail and log why
+                yield src, size, mtime
+                continue
+            if existing is None:
+                dicFirst[(size, digest)] = dest
+                dicDigests[src] = digest
+                yield src, size, mtime
+            else:
+                if self.dicOpts['Verify checksums after']:
+                    self._checks.put_digest(dest, digest)
+                lstLinks.append((src, size, mtime, digest, dest, existing))
+
+    def link_duplicates(self, lstLinks: list, pathDest: str, index: DedupIndex) -> tuple:
+        """
+        Hardlinks the files held back by deduplicate to the copies of their content in the destination,
+        copying them after all if that can't be done (no hardlinks on the drive, too many links...)
+        :param lstLinks: (source, size, mtime, checksum, destination, existing file)
+        :param pathDest: the root destination path
+        :param index: the destination's DedupIndex
+        :return: count and size of the files that were already linked
+        """
+        countLinked = sizeLinked = 0
+        for src, size, mtime, digest, dest, existing in lstLinks:
+            if self.is_cancelled():
+                break
+            self.throttle(0, 1, pathDest)
+            relPath = os.path.relpath(dest, pathDest)
+            try:
+                if os.path.exists(dest) and os.path.samefile(dest, existing):
+                    countLinked += 1
+                    sizeLinked += size
+                    self.journal_file('Done', src, pathDest)
+                    self.report_progress(size, 1, pathDest)
+                    continue
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                os.link(existing, dest)
+            except OSError as e:
+                self.write_log(src, dest, "Hardlink (dedup)", e, pathDest=pathDest)
+                self.copy_file_to_destination(src, pathDest, size)
+                index.add(relPath, size, mtime, digest)
+                continue
+            self.write_log(src, dest, f"Hardlink (dedup) to {os.path.relpath(existing, pathDest)}",
+                           pathDest=pathDest)
+            self.metrics.add('hardlinks', size, 1)
+            # A hardlink has the date modified of the file it's linked to
+            index.add(relPath, size, os.stat(dest).st_mtime, digest)
+            self.journal_file('Done', src, pathDest)
+            self.report_progress(size, 1, pathDest)
+        return countLinked, sizeLinked
+
+    def unshare(self, dest: str, pathDest: str):
+        """
+        Removes a destination file about to be overwritten if it is hardlinked elsewhere by
+        'Deduplicate with hardlinks', so that writing to it can't change the other files too.
+        Safe to call from the copying threads.
+        """
+        if pathDest not in self._setDedupDests:
+            return
+        try:
+            if os.lstat(dest).st_nlink > 1:
+                os.remove(dest)
+        except FileNotFoundError:
+            pass
+
+    def stream_file_list(self):
+        """
+        Rescans the source in a background thread, handing over the files to copy as each folder is
+        sorted, rather than once the whole scan is done. The scan can run up to STREAM_QUEUE_FILES ahead.
+        Yields (path, size, mtime), the store and counters are complete once it is exhausted.
+        """
+        qFiles = queue.Queue(maxsize=STREAM_QUEUE_FILES)
+        evtStop = threading.Event()
+        lstErrors = []
+        end = object()
+
+        def put(item):
+            while not evtStop.is_set():
+                try:
+                    qFiles.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+            raise CopyCancelled("Stopped reading the scan")
+
+        def scan():
+            try:
+                self.scan_source(onFolder=lambda lstFiles: [put(x) for x in lstFiles])
+            except CopyCancelled:
+                return
+            except Exception as e:
+                lstErrors.append(e)
+            try:
+                put(end)
+            except CopyCancelled:
+                pass
+
+        thScan = threading.Thread(target=scan, name='scan', daemon=True)
+        thScan.start()
+        try:
+            while True:
+                item = qFiles.get()
+                if item is end:
+                    break
+                yield item
+        finally:
+            evtStop.set()
+            thScan.join()
+        if lstErrors:
+            raise lstErrors[0]
+
+    def copy_files_streaming(self):
+        """
+        Copy the files to every destination as the scan finds them.
+        Folders are created as the files need them, reproduce_folder_structure does the rest afterwards.
+        """
+        dicSkipped = {pathDest: [0, 0] for pathDest in self.lstPathDest}
+        setFolders = set()
+
+        def copy_one(pair):
+            (src, size, mtime), pathDest = pair
+            folder = os.path.dirname(os.path.join(pathDest, os.path.relpath(src, self.pathSource)))
+            if folder not in setFolders:
                 try:
-                    shutil.copy2(src, dest)
-                    self.write_log(src, dest, "Copy")
+                    for created in self.make_folders(folder, pathDest):
+                        self.write_log(os.path.join(self.pathSource, os.path.relpath(created, pathDest)), created,
+                                       "Create folder", pathDest=pathDest)
                 except Exception as e:
-                    self.write_log(src, dest, "Copy", e)
-                self.progSize += os.path.getsize(src)
-                self.progCount += 1
-                if progress:
-                    progress[index] = self.progSize
-            if self.dicOpts['Reset permissions']:
-                self.reset_permissions()
+                    self.write_log(os.path.dirname(src), folder, "Create folder", e, pathDest=pathDest)
+                setFolders.add(folder)
+            return self.copy_file_to_destination(src, pathDest, size)
 
-        if self.dicOpts['Check sizes after']:
-            okayToDelete = self.check_metadata()
+        genFiles = self.stream_file_list()
+        try:
+            pairs = ((item, pathDest) for item in takewhile(lambda x: not self.is_cancelled(), genFiles)
+                     for pathDest in self.lstPathDest)
+            if self.dicSettings['Copy threads'] > 1:
+                results = imap_threaded(copy_one, pairs, self.dicSettings['Copy threads'])
+            else:
+                results = ((pair, copy_one(pair)) for pair in pairs)
+
+            for ((src, size, mtime), pathDest), copied in results:
+                if not copied:
+                    dicSkipped[pathDest][0] += 1
+                    dicSkipped[pathDest][1] += size
+        finally:
+            genFiles.close()
+
+        if self.dicOpts['Only copy new/changed files']:
+            for pathDest, (countSkipped, sizeSkipped) in dicSkipped.items():
+                self.write_log(self.pathSource, pathDest,
+                               f"Skipped {countSkipped} unchanged files ({self.human_readable(sizeSkipped)})",
+                               pathDest=pathDest)
+
+    def copy_files_fan_out(self):
+        """
+        Copy the files to all the destinations at once, reading each source file only once.
+        Every destination has its own writer thread fed through a bounded queue, so a slow
+        destination can fall behind by up to 'Fan-out buffer (MB)' before it holds up the reading.
+        """
+        chunkSize = self.dicSettings['Copy buffer (MB)'] * 2**20
+        maxChunks = max(1, self.dicSettings['Fan-out buffer (MB)'] * 2**20 // chunkSize)
+        dicWriters = {pathDest: _DestinationWriter(self, pathDest, maxChunks) for pathDest in self.lstPathDest}
+        dicSkipped = {pathDest: [0, 0] for pathDest in self.lstPathDest}
+        for writer in dicWriters.values():
+            writer.start()
 
-        if self.dicOpts['Delete after'] and okayToDelete:
-            self.delete_source_files()
+        try:
+            for src, size, mtime in self.iter_files_to_copy(withStats=True):
+                if self.is_cancelled():
+                    break
+                file = os.path.relpath(src, self.pathSource)
+                lstTargets = []
+                for pathDest, writer in dicWriters.items():
+                    dest = os.path.join(pathDest, file)
+                    if self.done_before(src, pathDest):
+                        continue
+                    if (self.dicOpts['Only copy new/changed files'] and (pathDest, file) not in self._setInFlight
+                            and self.files_match(src, dest)):
+                        self.journal_file('Done', src, pathDest)
+                        dicSkipped[pathDest][0] += 1
+                        dicSkipped[pathDest][1] += size
+                    else:
+                        lstTargets.append((writer, dest))
+
+                reported = 0  # To each destination
+                start = time.monotonic()
+                if lstTargets:
+                    self.report_current_file(src)
+                    for writer, dest in lstTargets:
+                        self.journal_file('Started', src, writer.pathDest)
+                        writer.put(('open', src, dest))
+                    hasher = hashlib.blake2b() if self.dicOpts['Verify checksums after'] else None
+                    try:
+                        with open(src, 'rb') as fileSrc:
+                            for chunk in iter(partial(fileSrc.read, chunkSize), b''):
+                                if self.is_cancelled():
+                                    raise CopyCancelled("Cancelled by user")
+                                if hasher is not None:
+                                    hasher.update(chunk)
+                                for writer, dest in lstTargets:
+                                    writer.put(('data', chunk))
+                                    self.report_progress(len(chunk), 0, writer.pathDest)
+                                reported += len(chunk)
+                    except Exception as e:
+                        for writer, dest in lstTargets:
+                            writer.put(('abort', e))
+                    else:
+                        for writer, dest in lstTargets:
+                            if hasher is not None:
+                                self._checks.put_digest(dest, hasher.digest())
+                            writer.put(('close',))
+                            # Read time, the writers may still be behind
+                            self.metrics.time_file('copy', size, time.monotonic() - start)
+
+                if not self.is_cancelled():
+                    setTargets = {writer.pathDest for writer, dest in lstTargets}
+                    for pathDest in self.lstPathDest:
+                        self.report_progress(size - (reported if pathDest in setTargets else 0), 1, pathDest)
+        finally:
+            for writer in dicWriters.values():
+                writer.put(('stop',))
+            for writer in dicWriters.values():
+                writer.join()
+
+        if self.dicOpts['Only copy new/changed files']:
+            for pathDest, (countSkipped, sizeSkipped) in dicSkipped.items():
+                self.write_log(self.pathSource, pathDest,
+                               f"Skipped {countSkipped} unchanged files ({self.human_readable(sizeSkipped)})",
+                               pathDest=pathDest)
 
     def check_metadata(self):
         """
-        Check the file sizes between the source and the destinations after the copy
+        Check the file sizes between the source and the destinations after the copy.
+        A file that can't be checked (missing from a destination etc.) fails.
+        The files that pass are noted for delete_source_files, see CheckResults.
         """
         allFileSizesMatch = True
+        checks = self.get_check_results()
+        checks.start_check()
         for pathDest in self.lstPathDest:
-            for src in self.get_file_list():
+            for src in self.iter_files_to_copy():
                 file = os.path.relpath(src, self.pathSource)
                 dest = os.path.join(pathDest, file)
                 try:
                     if os.path.getsize(src) == os.path.getsize(dest):
-                        self.write_log(src, dest, "File sizes match.")
+                        self.write_log(src, dest, "File sizes match.", pathDest=pathDest)
+                        checks.passed(file)
                     else:
                         allFileSizesMatch = False
-                        self.write_log(src, dest, "File sizes do not match")
+                        self.write_log(src, dest, "File sizes do not match", pathDest=pathDest)
                 except Exception as e:
-                    self.write_log(src, dest, "Check if file sizes match", e)
+                    allFileSizesMatch = False
+                    self.write_log(src, dest, "Check if file sizes match", e, pathDest=pathDest)
 
         return allFileSizesMatch
 
-    def reset_permissions(self):
+    def new_check_results(self):
         """
-        Reset the permissions for the transferred files.
-        Currently UNIX only. Please contact developer if you need Windows support.
+        Starts the CheckResults of a new run, on disk if there's a 'Scan memory budget (MB)'
         """
-        if sys.platform == 'darwin':
-            for destPath in self.lstPathDest:
-                try:
-                    subprocess.run(['chmod', '-RN', destPath], check=True)
-                    self.write_log("-", destPath, "Recursively cleared all permissions")
-                except Exception as e:
-                    self.write_log("-", destPath, "Recursively cleared all permissions", e)
-        if os.name == 'posix':
-            for destPath in self.lstPathDest:
-                try:
-                    subprocess.run(['chmod', '-R', '777', destPath], check=True)
-                    self.write_log("-", destPath, "Recursively set all permissions to read/write")
-                except Exception as e:
-                    self.write_log("-", destPath, "Recursively set all permissions to read/write", e)
+        if self._checks is not None:
+            self._checks.close()
+        self._checks = CheckResults(onDisk=self.dicSettings['Scan memory budget (MB)'] > 0)
 
+    def get_check_results(self) -> CheckResults:
+        """
+        The CheckResults of the latest run, started if there hasn't been one
+        """
+        if self._checks is None:
+            self.new_check_results()
+        return self._checks
+
+    def verify_checksums(self) -> bool:
+        """
+        Reads the files back from every destination and compares their checksums with those taken from
+        the source while copying, once their sizes have been found to match the scan. Files that weren't
+        copied this time (unchanged) are compared with the source itself. 'Verify threads' files are read
+        at once, and with 'Bypass cache when verifying' each file is flushed and dropped from the page cache
+        first, so it really comes off the disk.
+        Each destination gets a manifest of the checksums in its Backup logs, see verify_destination.
+        The reading is throttled by 'Max MB/s' and 'Max files/s' like the copy.
+        The files that match are noted for delete_source_files, see CheckResults.
+        :return: True if every checksum matched
+        """
+        dropCache = self.dicOpts['Bypass cache when verifying']
+        bufferSize = self.dicSettings['Copy buffer (MB)'] * 2**20
+        checks = self.get_check_results()
+        checks.start_check()
+
+        now = datetime.now()
+        dicManifests = {}
+        for pathDest in self.lstPathDest:
+            manifestPath = os.path.join(pathDest, 'Backup logs', f"{os.path.basename(self.get_source())} "
+                                        f"{now.strftime('%Y-%m-%d %H-%M-%S')}{MANIFEST_SUFFIX}")
+            with open(manifestPath, 'w', encoding='UTF-8') as file:
+                csv.writer(file).writerow(MANIFEST_HEADER)
+            dicManifests[pathDest] = LogWriter(manifestPath)
+
+        def verify_one(pair):
+            (src, size, mtime), pathDest = pair
+            file = os.path.relpath(src, self.pathSource)
+            dest = os.path.join(pathDest, file)
+            onPiece = partial(self.throttle, pathDest=pathDest)
+            self.throttle(0, 1, pathDest)
+            start = time.monotonic()
+            try:
+                # A short copy hashes the same as what was read for it, the size gives it away
+                destSize = os.path.getsize(dest)
+                if destSize != size:
+                    try:
+                        sourceNow = f"source now {os.path.getsize(src)}"
+                    except OSError as e:
+                        sourceNow = f"source now unreadable ({e})"
+                    self.write_log(src, dest, "File sizes do not match",
+                                   f"Scanned {size}, {sourceNow}, destination {destSize}", pathDest=pathDest)
+                    return False
+                expected = checks.get_digest(dest)
+                if expected is None:
+                    expected = hash_file(src, bufferSize, cancel=self._cancel, callback=self.throttle)
+                actual = hash_file(dest, bufferSize, dropCache, self._cancel, onPiece)
+            except CopyCancelled:
+                return False
+            except Exception as e:
+                self.write_log(src, dest, "Verify checksum", e, pathDest=pathDest)
+                return False
+            self.metrics.time_file('verify', size, time.monotonic() - start)
+            # What the file should be, even if this copy of it isn't
+            dicManifests[pathDest].write([file, size, mtime, expected.hex()])
+            if actual != expected:
+                self.write_log(src, dest, "Checksums do not match",
+                               f"Source {expected.hex()}, destination {actual.hex()}", pathDest=pathDest)
+                return False
+            self.write_log(src, dest, f"Checksums match ({actual.hex()})", pathDest=pathDest)
+            return True
+
+        pairs = ((item, pathDest) for pathDest in self.lstPathDest
+                 for item in self.iter_files_to_copy(withStats=True))
+        pairs = takewhile(lambda x: not self.is_cancelled(), pairs)
+        if self.dicSettings['Verify threads'] > 1:
+            results = imap_threaded(verify_one, pairs, self.dicSettings['Verify threads'])
         else:
+            results = ((pair, verify_one(pair)) for pair in pairs)
+
+        allChecksumsMatch = True
+        try:
+            for ((src, size, mtime), pathDest), match in results:
+                allChecksumsMatch = allChecksumsMatch and match
+                if match:
+                    checks.passed(os.path.relpath(src, self.pathSource))
+        finally:
+            for manifest in dicManifests.values():
+                manifest.close()
+        checks.clear_digests()
+        return allChecksumsMatch and not self.is_cancelled()
+
+    def get_permissions_mode(self) -> int:
+        """
+        The 'Permissions mode' setting as a mode for os.chmod
+        """
+        return int(str(self.dicSettings['Permissions mode']), 8)
+
+    def set_permissions(self, path: str, pathDest: str, src: str = "-"):
+        """
+        Gives a file just copied the 'Permissions mode', if 'Reset permissions' is on.
+        Safe to call from the copying threads.
+        :param path: the new file in the destination
+        :param pathDest: the root destination path
+        :param src: the source file, for the log
+        """
+        if not self.dicOpts['Reset permissions'] or os.name != 'posix':
+            return
+        try:
+            os.chmod(path, self.get_permissions_mode())
+        except Exception as e:
+            self.write_log(src, path, "Set permissions", e, pathDest=pathDest)
+        if sys.platform == 'darwin':
+            self._lstClearAcls.append((pathDest, path))
+
+    def make_folders(self, folder: str, pathDest: str) -> list:
+        """
+        Like os.makedirs, but notes every folder it creates for reset_permissions.
+        Safe to call from the copying threads, a folder another thread has just made is left to that thread.
+        :param folder: the folder wanted in the destination
+        :param pathDest: the root destination path
+        :return: the folders created, top-down
+        """
+        lstMissing = []
+        while not os.path.isdir(folder):
+            lstMissing.append(folder)
+            folder = os.path.dirname(folder)
+        lstCreated = []
+        for path in reversed(lstMissing):
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                continue
+            self.created_folder(path, pathDest)
+            lstCreated.append(path)
+        return lstCreated
+
+    def created_folder(self, path: str, pathDest: str):
+        """
+        Notes a folder made in a destination, reset_permissions deals with it once the copy is done
+        so a mode without write access can't get in the way of copying into it.
+        """
+        if self.dicOpts['Reset permissions'] and os.name == 'posix':
+            self._lstCreatedDirs.append((pathDest, path))
+            if sys.platform == 'darwin':
+                self._lstClearAcls.append((pathDest, path))
+
+    def reset_permissions(self):
+        """
+        Reset the permissions for what this run created in the destinations. The files have already had
+        theirs set as they were copied (see set_permissions), so this is left with the new folders,
+        deepest first, and on macOS clearing the ACLs of everything new with chmod -N in batches.
+        Only what was copied is touched, not the rest of the archive.
+        Currently UNIX only. Please contact developer if you need Windows support.
+        """
+        if os.name != 'posix':
             return False
 
-        # for destPath in self.lstPathDest:
-        #     for path, dirs, files in os.walk(destPath):
-        #         for d in dirs:
-        #             try:
-        #                 os.chmod(path + d, 0o777)
-        #                 self.write_log("-", path + d, "Set permissions to read/write")
-        #             except Exception as e:
-        #                 self.write_log("-", path + d, "Set permissions to read/write", e)
-        #         for f in files:
-        #             try:
-        #                 os.chmod(path + f, 0o777)
-        #                 self.write_log("-", path + f, "Set permissions to read/write")
-        #             except Exception as e:
-        #                 self.write_log("-", path + f, "Set permissions to read/write", e)
+        mode = self.get_permissions_mode()
+        for pathDest, path in reversed(self._lstCreatedDirs):
+            try:
+                os.chmod(path, mode)
+            except Exception as e:
+                self.write_log("-", path, "Set permissions", e, pathDest=pathDest)
+
+        if sys.platform == 'darwin':
+            dicPaths = {pathDest: [] for pathDest in self.lstPathDest}
+            for pathDest, path in self._lstClearAcls:
+                dicPaths[pathDest].append(path)
+            for pathDest, lstPaths in dicPaths.items():
+                for i in range(0, len(lstPaths), CHMOD_BATCH):
+                    try:
+                        subprocess.run(['chmod', '-N', *lstPaths[i:i + CHMOD_BATCH]], check=True)
+                    except Exception as e:
+                        self.write_log("-", pathDest, "Cleared permissions", e, pathDest=pathDest)
+                self.write_log("-", pathDest, f"Cleared permissions of {len(lstPaths)} new files and folders",
+                               pathDest=pathDest)
+
+        self._lstCreatedDirs = []
+        self._lstClearAcls = []
+        for pathDest in self.lstPathDest:
+            self.write_log("-", pathDest, f"Set permissions of the new files and folders to {mode:o}",
+                           pathDest=pathDest)
 
     def delete_source_files(self):
         """
-        Delete the original sources (preferably once the backups have been verified)
-        """
-        for srcPath, dirs, files in os.walk(self.pathSource, topdown=False):
-            for f in files:
-                try:
-                    src = os.path.join(srcPath, f)
-                    self.write_log(src, '', "Deleting")
-                    os.remove(src)
-                except Exception as e:
-                    self.write_log(src, '', "Deleting", e)
-            for d in dirs:
-                try:
-                    src = os.path.join(srcPath, d)
-                    self.write_log(src, '', "Deleting")
-                    os.rmdir(src)
-                except Exception as e:
+        Delete the original sources once the backups have been checked (check_metadata, verify_checksums).
+        Only the files that passed the checks in every destination are deleted, and only if their size and
+        date modified are still what the scan found, so files that arrived or changed since are left alone.
+        'Delete threads' files are deleted at once, then the folders left empty, deepest first.
+        'Max files/s' applies to the files.
+        """
+        checks = self.get_check_results()
+
+        def delete_one(item):
+            src, size, mtime = item
+            if not checks.passed_all(os.path.relpath(src, self.pathSource), len(self.lstPathDest)):
+                return "Not deleted, the copies did not pass the checks"
+            self.throttle(0, 1)
+            start = time.monotonic()
+            try:
+                stats = os.stat(src)
+                if stats.st_size != size or stats.st_mtime != mtime:
+                    return "Not deleted, changed since the scan"
+                os.remove(src)
+            except Exception as e:
+                return e
+            self.metrics.time_file('delete', size, time.monotonic() - start)
+            return ""
+
+        lstFiles = takewhile(lambda x: not self.is_cancelled(), self.iter_files_to_copy(withStats=True))
+        if self.dicSettings['Delete threads'] > 1:
+            results = imap_threaded(delete_one, lstFiles, self.dicSettings['Delete threads'])
+        else:
+            results = ((item, delete_one(item)) for item in lstFiles)
+        for (src, size, mtime), error in results:
+            self.write_log(src, '', "Deleting", error)
+
+        if self.is_cancelled():
+            return
+
+        if self.dicOpts['Copy invisible files']:
+            lstDirs = list(self.store.iter_folders(DIR_VISIBLE | DIR_INVISIBLE))
+        else:
+            lstDirs = list(self.store.iter_folders(DIR_VISIBLE))
+        # The scan found parents before their children, so backwards is deepest first
+        for src in reversed(lstDirs):
+            try:
+                os.rmdir(src)
+                self.write_log(src, '', "Deleting")
+            except OSError as e:
+                if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                    # Still holds files that weren't copied
+                    self.write_log(src, '', "Deleting", "Not deleted, not empty")
+                elif e.errno != errno.ENOENT:
                     self.write_log(src, '', "Deleting", e)
 
     def create_log(self, copyDest: str):
@@ -638,6 +3400,7 @@ class BackupJob:
         today = str(date.today())
 
         self.strLogFileName = f"{copyDest}/Backup logs/{os.path.basename(self.get_source())} {today} main.csv"
+        self.dicLogFileNames[copyDest] = self.strLogFileName
         os.makedirs(os.path.dirname(self.strLogFileName), exist_ok=True)
 
         with open(self.strLogFileName, 'w', encoding='UTF-8') as file:
@@ -653,6 +3416,9 @@ class BackupJob:
             writer.writerow(["Options:"])
             for option, value in self.get_options().items():
                 writer.writerow(["", option, value])
+            writer.writerow(["Settings:"])
+            for setting, value in self.get_settings().items():
+                writer.writerow(["", setting, value])
             writer.writerow(["Directories to skip:"])
             for i in self.get_dirs_to_skip():
                 writer.writerow(["", i])
@@ -672,20 +3438,53 @@ class BackupJob:
                 [now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), "-", f"{self.strLogFileName}", "Log file created"],
             )
 
-    def write_log(self, source: str, dest: str, action: str, error: str = ""):
+    def open_log(self, copyDest: str):
+        """
+        Keeps the log of a destination open for buffered writing until close_logs is called.
+        :param copyDest: the root destination path, create_log must have been called for it
+        """
+        strLogFileName = self.dicLogFileNames[copyDest]
+        if strLogFileName not in self._dicLogWriters:
+            self._dicLogWriters[strLogFileName] = LogWriter(strLogFileName)
+
+    def close_logs(self):
+        """
+        Writes out any buffered log rows and closes the open logs
+        :raises IOError: once they're all closed, for the first that couldn't be written
+        """
+        dicLogWriters, self._dicLogWriters = self._dicLogWriters, {}
+        error = None
+        for logWriter in dicLogWriters.values():
+            try:
+                logWriter.close()
+            except IOError as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def write_log(self, source: str, dest: str, action: str, error: str = "", pathDest: str = None):
         """
         Writes the actions to a log (append mode).
+        If the log has been opened with open_log, the row is buffered rather than written straight away.
         :param source: source file path
         :param dest: destination file path
         :param action: the intended operation
         :param error: any error received (optional)
+        :param pathDest: the root destination whose log to write to (optional, defaults to the latest log)
         """
-        with open(self.strLogFileName, 'a', encoding='UTF-8') as file:
+        if error and self._progress is not None and pathDest in self.lstPathDest:
+            with self._lockProgress:
+                self._progress.add(self._progressIndex, 'Errors', 1, self.lstPathDest.index(pathDest))
+        strLogFileName = self.dicLogFileNames.get(pathDest, self.strLogFileName)
+        now = datetime.now()
+        row = [now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), source, dest, action, error]
+        logWriter = self._dicLogWriters.get(strLogFileName)
+        if logWriter:
+            logWriter.write(row)
+            return
+        with self._lockLog, open(strLogFileName, 'a', encoding='UTF-8') as file:
             writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            now = datetime.now()
-            writer.writerow(
-                [now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), source, dest, action, error]
-            )
+            writer.writerow(row)
 
     def make_job_dict(self) -> dict:
         """
@@ -697,6 +3496,8 @@ class BackupJob:
             'Source': self.pathSource,
             'Destinations': self.lstPathDest,
             'Options': self.dicOpts,
+            'Settings': self.dicSettings,
+            'Destination limits': self.dicDestLimits,
             'Folders to skip': self.lstDirsToSkip,
             'File types to filter': self.lstFilters,
             'Number of files to copy': self.countFiles,
@@ -713,7 +3514,14 @@ class BackupJob:
         self.set_source(dicJob['Source'])
         for i in dicJob['Destinations']:
             self.add_destination(i)
-        self.set_options(dicJob['Options'])
+        # Options added since the queue was saved keep their defaults
+        self.set_options({**self.dicOpts, **dicJob['Options']})
+        try:
+            self.set_settings(dicJob['Settings'])
+        except KeyError:
+            pass
+        for dest, dicLimits in dicJob.get('Destination limits', {}).items():
+            self.set_destination_limits(dest, dicLimits)
         self.add_dirs_to_skip(dicJob['Folders to skip'])
         self.add_filter(dicJob['File types to filter'])
         try:
@@ -726,6 +3534,10 @@ class BackupJob:
             pass
 
 
+def _exit_on_signal(signum, frame):
+    sys.exit(128 + signum)
+
+
 class QueueToBackup:
     def __init__(self, queueFile=None):
         self.lstJobs = []
@@ -788,12 +3600,138 @@ class QueueToBackup:
             newJob = self.add_job()
             newJob.create_from_dict(dicYaml)
 
-    def run_queue(self, progress=None):
+    def make_progress_block(self) -> ProgressBlock:
+        """
+        A ProgressBlock with room for every job and destination, to hand to run_queue
+        """
+        return ProgressBlock(len(self.lstJobs), max([len(job.get_destinations()) for job in self.lstJobs] + [1]))
+
+    def make_limit_block(self) -> LimitBlock:
+        """
+        A LimitBlock holding every job's and destination's limits as they are now, to hand to run_queue
+        """
+        limits = LimitBlock(len(self.lstJobs), max([len(job.get_destinations()) for job in self.lstJobs] + [1]))
+        for count, job in enumerate(self.lstJobs):
+            for limit in LIMIT_SETTINGS:
+                limits.set(count, limit, job.get_settings()[limit])
+                for countDest, pathDest in enumerate(job.get_destinations()):
+                    limits.set(count, limit, job.get_destination_limits(pathDest)[limit], countDest)
+        return limits
+
+    def journal_folder(self) -> str:
+        """
+        Where run_queue keeps the journal and scans of this queue, named after what the jobs copy and how,
+        so a different queue can't pick up its journal (the performance settings can change in between)
+        """
+        lstJobs = [{key: value for key, value in job.make_job_dict().items()
+                    if key not in ('Number of files to copy', 'Total file size', 'Settings', 'Destination limits')}
+                   for job in self.lstJobs]
+        digest = hashlib.blake2b(json.dumps(lstJobs, sort_keys=True).encode(), digest_size=8).hexdigest()
+        return os.path.join(PATH_APP_DATA, 'Journals', f"queue {digest}")
+
+    def run_queue(self, progress=None, cancel=None, resume: bool = False, maxJobs: int = QUEUE_MAX_JOBS,
+                  limits=None):
         """
-        Processes the list of jobs
+        Processes the list of jobs.
+        Jobs that don't share a drive (source or destination, see BackupJob.get_devices) run at the same time,
+        up to maxJobs of them, while jobs that do share one take turns in queue order, so the drive's heads
+        aren't pulled back and forth between them. A job that fails stops any more jobs from starting, and
+        its error is raised once the running ones are done.
+        Everything copied is recorded in a Journal, with each job's scan saved next to it. With resume,
+        a run that died part way carries on from the journal of the same queue: finished jobs are skipped,
+        the scans are read back rather than done again, the files already done are skipped without looking
+        at them, and the ones that were being copied are copied again. The journal goes once the queue
+        finishes without being cancelled.
+        :param progress: optional ProgressBlock for the jobs to report to, see make_progress_block
+        :param cancel: optional Event to stop the queue
+        :param resume: carry on from the journal of a previous run of this queue, if there is one
+        :param maxJobs: most jobs to run at once, 1 for one after the other
+        :param limits: optional LimitBlock to change the jobs' and destinations' limits through while the
+                       queue runs, see make_limit_block
         """
-        for count, job in enumerate(self.get_jobs()):
-            job.copy_files(progress, count)
+        # Being terminated should still unwind the jobs, so their logs get written out
+        try:
+            signal.signal(signal.SIGTERM, _exit_on_signal)
+        except ValueError:
+            pass  # Not the main thread, the caller handles signals
+
+        pathJournal = self.journal_folder()
+        journalFile = os.path.join(pathJournal, 'journal.csv')
+        if resume and os.path.exists(journalFile):
+            setJobsDone, dicDone, dicInFlight = Journal.read(journalFile)
+        else:
+            shutil.rmtree(pathJournal, ignore_errors=True)
+            setJobsDone, dicDone, dicInFlight = set(), {}, {}
+        os.makedirs(pathJournal, exist_ok=True)
+        journal = Journal(journalFile)
+
+        # The jobs in other threads need an Event to be stopped by, if the caller didn't give one
+        if cancel is None:
+            cancel = threading.Event()
+
+        def run_job(count):
+            job = self.lstJobs[count]
+            scanFile = os.path.join(pathJournal, f"job {count} scan")
+            if os.path.exists(scanFile):
+                job.load_scan(scanFile)
+            elif len(job.store) or not job.dicOpts['Start copying while scanning']:
+                # Streaming jobs scan as they go, a resumed one just scans again
+                if not len(job.store):
+                    job.scan_source()
+                job.store.save(scanFile)
+            job.set_journal(journal, count, dicDone.get(count), dicInFlight.get(count))
+            try:
+                job.copy_files(progress, count, cancel, limits)
+            finally:
+                job.set_journal(None)
+            if not cancel.is_set():
+                journal.write(["Job done", count, "", ""])
+
+        lstDevices = [job.get_devices() for job in self.lstJobs]
+        lstPending = []
+        for count, job in enumerate(self.lstJobs):
+            if count in setJobsDone:
+                if progress is not None:
+                    progress.set(count, 'Bytes', job.sizeFiles * len(job.get_destinations()))
+                    progress.set(count, 'Total bytes', job.sizeFiles * len(job.get_destinations()))
+                    progress.set_state(count, 'Done')
+            else:
+                lstPending.append(count)
+        dicRunning = {}  # {future: job number}
+        error = None
+        executor = ThreadPoolExecutor(max(1, maxJobs), thread_name_prefix='job')
+        try:
+            while lstPending or dicRunning:
+                if error is None and not cancel.is_set():
+                    # Start every job that shares no drive with a running job, or one ahead of it in the queue
+                    setBusy = set().union(*(lstDevices[count] for count in dicRunning.values()))
+                    for count in list(lstPending):
+                        if len(dicRunning) >= max(1, maxJobs):
+                            break
+                        if not lstDevices[count] & setBusy:
+                            lstPending.remove(count)
+                            dicRunning[executor.submit(run_job, count)] = count
+                        setBusy |= lstDevices[count]
+                elif not dicRunning:
+                    break
+                done, notDone = wait(dicRunning, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del dicRunning[future]
+                    if future.exception() is not None and error is None:
+                        error = future.exception()
+        except BaseException:
+            # Terminated (see _exit_on_signal) or interrupted, stop the running jobs so they unwind cleanly
+            cancel.set()
+            wait(dicRunning)
+            raise
+        finally:
+            executor.shutdown()
+            journal.close()
+
+        if error is not None:
+            raise error
+        if not cancel.is_set():
+            shutil.rmtree(pathJournal, ignore_errors=True)
 
 
 def test_copy():
@@ -809,7 +3747,14 @@ def test_copy():
             'Reset permissions': True,
             'Skip empty folders': False,
             'Copy invisible files': True,
-            'Keep only most recent videos': False
+            'Keep only most recent videos': False,
+            'Reuse previous scan': False,
+            'Only copy new/changed files': False,
+            'Read source once for all destinations': False,
+            'Start copying while scanning': False,
+            'Verify checksums after': False,
+            'Bypass cache when verifying': False,
+            'Deduplicate with hardlinks': False
         }
     )
     job.add_filter(['.yaml'])
@@ -1,6 +1,6 @@
 import os
 import datetime as dt
-from time import sleep
+from time import sleep, monotonic
 import multiprocessing
 import threading
 
@@ -8,7 +8,7 @@ import wx
 from wx.lib.newevent import NewEvent
 import wx.adv
 
-from backup_data import BackupJob, QueueToBackup
+from backup_data import BackupJob, QueueToBackup, ProgressRate, QUEUE_MAX_JOBS, LIMIT_SETTINGS, SETTING_MINIMUMS
 
 # TO DO:
 #   - Raise all errors to messageboxes
@@ -36,6 +36,8 @@ class FrMainwindow(wx.Frame):
         self.cancelButSchedule = False  # State of schedule button
         self.cancelCountdown = False  # Variable to abort countdown thread
         self.cancelButLaunch = False  # State of launch now button
+        self.limitBlock = None  # Each job's and destination's Max MB/s and Max files/s, shared with the running queue
+        self.dicRates = {}  # {job number: ProgressRate} while the queue runs
 
         # Initalise GUI content
         self.populate_job_summary()
@@ -154,6 +156,19 @@ class FrMainwindow(wx.Frame):
             self.Bind(wx.EVT_CHECKBOX, self.on_chkBox, chkBoxOpt)
         lstBoxes[0][1].Add(self.boxOptsSizer, 1, wx.ALL | wx.EXPAND, 5)
 
+        self.boxSettings = wx.StaticBox(self.panMaster, label="Performance settings")
+        self.boxSettingsSizer = wx.StaticBoxSizer(self.boxSettings, wx.VERTICAL)
+        settingsGrid = wx.FlexGridSizer(2, 5, 5)
+        self.dicSpinSettings = {}
+        for setting, value in dummy.get_settings().items():
+            spin = wx.SpinCtrl(self.panMaster, min=SETTING_MINIMUMS.get(setting, 0), max=2**31 - 1, initial=value)
+            self.Bind(wx.EVT_SPINCTRL, self.on_spinSetting, spin)
+            settingsGrid.Add(wx.StaticText(self.panMaster, label=setting), 0, wx.ALIGN_CENTER_VERTICAL)
+            settingsGrid.Add(spin, 0)
+            self.dicSpinSettings[setting] = spin
+        self.boxSettingsSizer.Add(settingsGrid, 0, wx.ALL, 5)
+        lstBoxes[0][1].Add(self.boxSettingsSizer, 1, wx.ALL | wx.EXPAND, 5)
+
         buttonBox = wx.StaticBox(self.panMaster, label="Exclude file types")
         buttonBoxSizer = wx.StaticBoxSizer(buttonBox, wx.VERTICAL)
         self.entFilter = wx.TextCtrl(self.panMaster, style=wx.TE_PROCESS_ENTER)
@@ -179,6 +194,17 @@ class FrMainwindow(wx.Frame):
         self.lstBoxDest.Bind(wx.EVT_CHAR_HOOK, self.on_keyLstBoxDest)
         self.butNoDest = wx.Button(self.panMaster, label="Remove destination")
         self.butNoDest.Bind(wx.EVT_BUTTON, self.on_butNoDest)
+        self.lstBoxDest.Bind(wx.EVT_LISTBOX, self.on_lstBoxDest_select)
+        destLimitsGrid = wx.FlexGridSizer(2, 5, 5)
+        self.dicSpinDestLimits = {}
+        for limit in LIMIT_SETTINGS:
+            spin = wx.SpinCtrl(self.panMaster, min=0, max=2**31 - 1, initial=0)
+            spin.Disable()
+            self.Bind(wx.EVT_SPINCTRL, self.on_spinDestLimit, spin)
+            destLimitsGrid.Add(wx.StaticText(self.panMaster, label=f"Selected destinations' {limit}"), 0,
+                               wx.ALIGN_CENTER_VERTICAL)
+            destLimitsGrid.Add(spin, 0)
+            self.dicSpinDestLimits[limit] = spin
         self.txtExclude = wx.StaticText(self.panMaster, label="Folders to exclude")
         self.lstBoxExclude = wx.ListBox(self.panMaster, style=wx.LB_MULTIPLE)
         self.lstBoxExclude.Bind(wx.EVT_CHAR_HOOK, self.on_keyLstBoxExclude)
@@ -204,6 +230,7 @@ class FrMainwindow(wx.Frame):
         infoBoxSizer.Add(self.txtDest, 0, wx.TOP | wx.ALIGN_CENTER, 15)
         infoBoxSizer.Add(self.lstBoxDest, 0, wx.ALL | wx.EXPAND, 2)
         infoBoxSizer.Add(self.butNoDest, 0, wx.ALL | wx.ALIGN_CENTER, 2)
+        infoBoxSizer.Add(destLimitsGrid, 0, wx.ALL | wx.ALIGN_CENTER, 2)
         infoBoxSizer.Add(self.txtExclude, 0, wx.TOP | wx.ALIGN_CENTER, 15)
         infoBoxSizer.Add(self.lstBoxExclude, 0, wx.ALL | wx.EXPAND, 2)
         infoBoxSizer.Add(self.butNoExclude, 0, wx.ALL | wx.ALIGN_CENTER, 2)
@@ -233,6 +260,11 @@ class FrMainwindow(wx.Frame):
         self.lstCtlQueue.InsertColumn(1, 'No. of Files', width=100)
         self.lstCtlQueue.InsertColumn(2, 'Size', width=100)
         self.lstCtlQueue.InsertColumn(3, 'Copied', width=100)
+        self.lstCtlQueue.InsertColumn(4, 'Files done', width=90)
+        self.lstCtlQueue.InsertColumn(5, 'MB/s', width=70)
+        self.lstCtlQueue.InsertColumn(6, 'Files/s', width=70)
+        self.lstCtlQueue.InsertColumn(7, 'Time left', width=80)
+        self.lstCtlQueue.InsertColumn(8, 'Status', width=80)
         self.lstCtlQueue.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_lstQueue_select)
         self.lstCtlQueue.Bind(wx.EVT_CHAR_HOOK, self.on_lstQueue_key)
         lstBoxes[0][3].Add(self.txtQueue, 0, wx.ALL | wx.ALIGN_CENTER, 5)
@@ -240,6 +272,10 @@ class FrMainwindow(wx.Frame):
         lstBoxes[0][3].Add(self.lstCtlQueue, 1, wx.ALL | wx.EXPAND, 5)
         latestRow += 1
         lstBoxes[0][3].AddGrowableRow(latestRow)
+        # What the selected job is doing while the queue runs
+        self.txtJobProgress = wx.StaticText(self.panMaster, label="")
+        lstBoxes[0][3].Add(self.txtJobProgress, 0, wx.ALL | wx.EXPAND, 5)
+        latestRow += 1
 
         self.butNewJob = wx.Button(self.panMaster, label="New job")
         self.butNewJob.Bind(wx.EVT_BUTTON, self.on_butNewJob)
@@ -275,6 +311,24 @@ class FrMainwindow(wx.Frame):
         subSizer.Add(self.butGo, 1, wx.ALL | wx.ALIGN_CENTER, 5)
         self.scheduleBoxSizer.Add(subSizer, 1, wx.ALIGN_CENTER)
 
+        # Carry on from where a run of the same queue died (crash, reboot...), see QueueToBackup.run_queue
+        self.chkResume = wx.CheckBox(self.panMaster, label="Resume previous run")
+        self.scheduleBoxSizer.Add(self.chkResume, 0, wx.ALL | wx.ALIGN_CENTER, 5)
+
+        # Jobs on separate drives run side by side, up to this many
+        subSizer = wx.BoxSizer(wx.HORIZONTAL)
+        subSizer.Add(wx.StaticText(self.panMaster, label="Jobs at once"), 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.spinJobsAtOnce = wx.SpinCtrl(self.panMaster, min=1, max=64, initial=QUEUE_MAX_JOBS)
+        subSizer.Add(self.spinJobsAtOnce, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.scheduleBoxSizer.Add(subSizer, 0, wx.ALIGN_CENTER)
+
+        subSizer = wx.BoxSizer(wx.HORIZONTAL)
+        subSizer.Add(wx.StaticText(self.panMaster, label="Refresh progress every (s)"), 0,
+                     wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.spinRefresh = wx.SpinCtrlDouble(self.panMaster, min=0.1, max=60, initial=1, inc=0.1)
+        subSizer.Add(self.spinRefresh, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.scheduleBoxSizer.Add(subSizer, 0, wx.ALIGN_CENTER)
+
         self.txtQueueSched = wx.StaticText(self.panMaster, label="No queue scheduled", style=wx.ALIGN_CENTER_HORIZONTAL)
         self.scheduleBoxSizer.Add(self.txtQueueSched, 0, wx.ALL | wx.ALIGN_CENTER, 5)
 
@@ -374,6 +428,33 @@ class FrMainwindow(wx.Frame):
         self.queue.get_jobs()[self.intCurrentJob].set_options(dicOptions)
         self.populate_job_summary()
 
+    def on_spinSetting(self, event):
+        dicSettings = {label: spin.GetValue() for label, spin in self.dicSpinSettings.items()}
+        self.queue.get_jobs()[self.intCurrentJob].set_settings(dicSettings)
+        # The limits also reach a queue that is already running
+        if self.limitBlock is not None and self.intCurrentJob < self.limitBlock.nJobs:
+            for limit in LIMIT_SETTINGS:
+                self.limitBlock.set(self.intCurrentJob, limit, dicSettings[limit])
+
+    def on_lstBoxDest_select(self, event=None):
+        lstSelected = self.lstBoxDest.GetSelections()
+        for limit, spin in self.dicSpinDestLimits.items():
+            spin.Enable(bool(lstSelected))
+            if lstSelected:
+                dest = self.queue.get_jobs()[self.intCurrentJob].get_destinations()[lstSelected[0]]
+                spin.SetValue(self.queue.get_jobs()[self.intCurrentJob].get_destination_limits(dest)[limit])
+
+    def on_spinDestLimit(self, event):
+        job = self.queue.get_jobs()[self.intCurrentJob]
+        dicLimits = {limit: spin.GetValue() for limit, spin in self.dicSpinDestLimits.items()}
+        for count in self.lstBoxDest.GetSelections():
+            job.set_destination_limits(job.get_destinations()[count], dicLimits)
+            # Also reaching a queue that is already running
+            if (self.limitBlock is not None and self.intCurrentJob < self.limitBlock.nJobs
+                    and count < self.limitBlock.nDests):
+                for limit in LIMIT_SETTINGS:
+                    self.limitBlock.set(self.intCurrentJob, limit, dicLimits[limit], count)
+
     def on_butFilter(self, event):
         filt = self.entFilter.GetValue()
         if filt:
@@ -482,7 +563,8 @@ class FrMainwindow(wx.Frame):
     def on_butGo(self, event=None):
         if self.cancelButLaunch:
             # User clicked 'abort'
-            self.procRunQueue.terminate()
+            # Ask the copy to stop cleanly, launch_queue_processes terminates it if it takes too long
+            self.evtCancel.set()
             self.butGo.SetLabel("Launch now!")
             self.cancelButLaunch = False
             dialog = "No queue scheduled"
@@ -494,7 +576,9 @@ class FrMainwindow(wx.Frame):
                 wx.PostEvent(frame, EvtUpdateScheduleText(attr1=dialog))
                 # TO DO: Reset to 'No queue scheduled' after delay - need another thread...
             else:
-                self.thLaunch = threading.Thread(target=self.launch_queue_processes)
+                # Made here, so an abort clicked before the launch thread gets going still reaches this run
+                self.evtCancel = multiprocessing.Event()
+                self.thLaunch = threading.Thread(target=self.launch_queue_processes, args=(self.evtCancel,))
                 self.thLaunch.start()
                 self.butGo.SetLabel("Abort")
                 dialog = "Running queue"
@@ -573,22 +657,34 @@ class FrMainwindow(wx.Frame):
         self.panMaster.Layout()
 
     def get_file_list(self):
-        self.queue.get_jobs()[self.intCurrentJob].get_file_list(recalculate=True)
+        self.queue.get_jobs()[self.intCurrentJob].scan_source()
         self.populate_job_summary()
         self.populate_job_queue()
         dialog = "No queue scheduled"
         wx.PostEvent(frame, EvtUpdateScheduleText(attr1=dialog))
 
-    def launch_queue_processes(self):
+    def launch_queue_processes(self, evtCancel):
         # Put the process in a multiprocessing queue to allow it to communicate progress
-        progress = multiprocessing.Array('l', [0] * len(self.queue.get_jobs()))
-        self.procRunQueue = multiprocessing.Process(target=self.queue.run_queue, args=(progress,))
+        progress = self.queue.make_progress_block()
+        self.dicRates = {count: ProgressRate() for count in range(len(self.queue.get_jobs()))}
+        self.limitBlock = self.queue.make_limit_block()
+        self.procRunQueue = multiprocessing.Process(target=self.queue.run_queue,
+                                                    args=(progress, evtCancel, self.chkResume.GetValue(),
+                                                          self.spinJobsAtOnce.GetValue(), self.limitBlock))
         self.procRunQueue.start()
 
+        waitAfterCancel = 30  # seconds
+        cancelledAt = None
         while self.procRunQueue.is_alive():
             wx.PostEvent(frame, EvtUpdateProgress(attr1=progress))
-            sleep(1)
+            sleep(self.spinRefresh.GetValue())
+            if evtCancel.is_set():
+                if cancelledAt is None:
+                    cancelledAt = monotonic()
+                if monotonic() - cancelledAt >= waitAfterCancel:
+                    self.procRunQueue.terminate()
         # Get final size
+        self.limitBlock = None
 
         wx.PostEvent(frame, EvtUpdateProgress(attr1=progress))
         self.butGo.SetLabel("Launch now!")
@@ -597,8 +693,29 @@ class FrMainwindow(wx.Frame):
         wx.PostEvent(frame, EvtUpdateScheduleText(attr1=dialog))
 
     def update_progress_column(self, event):
+        progress = event.attr1
         for count, job in enumerate(self.queue.get_jobs()):
-            self.lstCtlQueue.SetItem(count, 3, BackupJob.human_readable(event.attr1[count]))
+            if count >= progress.nJobs or count not in self.dicRates:
+                break
+            bytesPerSecond, filesPerSecond, secondsLeft = self.dicRates[count].update(progress, count)
+            self.lstCtlQueue.SetItem(count, 3, BackupJob.human_readable(int(progress.get(count, 'Bytes'))))
+            self.lstCtlQueue.SetItem(count, 4, f"{int(progress.get(count, 'Files'))}"
+                                               f"/{int(progress.get(count, 'Total files'))}")
+            self.lstCtlQueue.SetItem(count, 5, f"{bytesPerSecond / 2**20:.1f}")
+            self.lstCtlQueue.SetItem(count, 6, f"{filesPerSecond:.1f}")
+            self.lstCtlQueue.SetItem(count, 7, "" if secondsLeft is None
+                                     else str(dt.timedelta(seconds=round(secondsLeft))))
+            self.lstCtlQueue.SetItem(count, 8, progress.get_state(count))
+
+        # The selected job's file and destinations
+        count = self.intCurrentJob
+        if 0 <= count < min(progress.nJobs, len(self.queue.get_jobs())):
+            lstLines = [progress.get_current_file(count)]
+            for destIndex, dest in enumerate(self.queue.get_jobs()[count].get_destinations()):
+                lstLines.append(f"{dest}: {BackupJob.human_readable(int(progress.get(count, 'Bytes', destIndex)))}, "
+                                f"{int(progress.get(count, 'Files', destIndex))} files, "
+                                f"{int(progress.get(count, 'Errors', destIndex))} errors")
+            self.txtJobProgress.SetLabel("\n".join(lstLines))
 
     def errors_in_queue(self):
         """
@@ -641,6 +758,7 @@ class FrMainwindow(wx.Frame):
         """
         if not self.queue.get_jobs():
             [x.SetValue(False) for x in self.dicChkBoxes.values()]
+            [x.Disable() for x in self.dicSpinDestLimits.values()]
             self.lstBoxSrc.Clear()
             self.lstBoxDest.Clear()
             self.lstBoxFilters.Clear()
@@ -652,6 +770,8 @@ class FrMainwindow(wx.Frame):
         # Options
         for opt, value in self.queue.get_jobs()[self.intCurrentJob].get_options().items():
             self.dicChkBoxes[opt].SetValue(value)
+        for setting, value in self.queue.get_jobs()[self.intCurrentJob].get_settings().items():
+            self.dicSpinSettings[setting].SetValue(value)
 
         # Source
         self.lstBoxSrc.Clear()
@@ -673,6 +793,7 @@ class FrMainwindow(wx.Frame):
         except UnboundLocalError:
             pass
         self.lstBoxDest.Append(lstPaths)
+        self.on_lstBoxDest_select()
 
         # Filters
         self.lstBoxFilters.Clear()
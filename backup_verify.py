@@ -0,0 +1,54 @@
+import sys
+import argparse
+
+from backup_data import verify_destination, compare_destinations, Scrubber
+
+# Checks backups made with 'Verify checksums after' against the manifests in their Backup logs,
+# without needing the source, which may well have been deleted by then.
+#   python backup_verify.py verify DESTINATION [--threads 4] [--bypass-cache]
+#   python backup_verify.py compare DESTINATION OTHER_DESTINATION
+#   python backup_verify.py scrub DESTINATION [--max-mb 500000] [--max-minutes 360]
+# scrub checks the files gone longest without a check, as much as the budget allows, to be run nightly (cron etc.)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check backups against their checksum manifests")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    verify = commands.add_parser('verify', help="read every file in a destination back and check its checksum")
+    verify.add_argument('destination')
+    verify.add_argument('--threads', type=int, default=2, help="files read at once")
+    verify.add_argument('--bypass-cache', action='store_true', help="read from the disk, not the page cache")
+
+    compare = commands.add_parser('compare', help="compare two destinations' manifests, without reading files")
+    compare.add_argument('destination')
+    compare.add_argument('other')
+
+    scrub = commands.add_parser('scrub', help="check the files gone longest without a check, within a budget")
+    scrub.add_argument('destination')
+    scrub.add_argument('--max-mb', type=int, default=0, help="most to read this run, 0 for no limit")
+    scrub.add_argument('--max-minutes', type=float, default=0, help="most time to spend this run, 0 for no limit")
+    scrub.add_argument('--threads', type=int, default=2, help="files read at once")
+    scrub.add_argument('--bypass-cache', action='store_true', help="read from the disk, not the page cache")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'verify':
+            lstProblems = verify_destination(args.destination, args.threads, args.bypass_cache)
+        elif args.command == 'scrub':
+            lstProblems = Scrubber(args.destination).run(args.max_mb * 2**20, args.max_minutes * 60,
+                                                         args.threads, args.bypass_cache)
+        else:
+            lstProblems = compare_destinations(args.destination, args.other)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    for relPath, problem in lstProblems:
+        print(f"{problem}: {relPath}")
+    print(f"{len(lstProblems)} problems found")
+    return 1 if lstProblems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
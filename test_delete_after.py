@@ -0,0 +1,91 @@
+import os
+import errno
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import backup_data
+from backup_data import BackupJob
+
+# 'Delete after' destroys the originals, these make sure a copy that failed never gets its source deleted
+#   python -m unittest test_delete_after
+
+
+class DeleteAfterTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.pathSource = os.path.join(self.root, 'source')
+        self.pathDest = os.path.join(self.root, 'destination')
+        os.makedirs(os.path.join(self.pathSource, 'folder'))
+        os.makedirs(self.pathDest)
+        self.lstFiles = [os.path.join(self.pathSource, 'folder', f"file{count}.txt") for count in range(3)]
+        for count, path in enumerate(self.lstFiles):
+            with open(path, 'wb') as file:
+                file.write(os.urandom(1000 * (count + 1)))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_job(self, **dicOpts) -> BackupJob:
+        job = BackupJob()
+        job.set_source(self.pathSource)
+        job.add_destination(self.pathDest)
+        dicAllOpts = job.get_options()
+        dicAllOpts.update(dicOpts)
+        job.set_options(dicAllOpts)
+        job.get_file_list(True)
+        return job
+
+    def fail_copy_of(self, failing: str):
+        """
+        copy_file_fast, except the copy of one file runs out of space
+        """
+        copy = backup_data.copy_file_fast
+
+        def copy_or_fail(src, dest, *args, **kwargs):
+            if src == failing:
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), dest)
+            return copy(src, dest, *args, **kwargs)
+        return mock.patch('backup_data.copy_file_fast', side_effect=copy_or_fail)
+
+    def test_failed_copy_is_not_deleted(self):
+        job = self.make_job(**{'Check sizes after': True, 'Delete after': True})
+        with self.fail_copy_of(self.lstFiles[1]):
+            job.copy_files()
+        self.assertTrue(os.path.exists(self.lstFiles[1]))
+
+    def test_only_files_that_passed_are_deleted(self):
+        job = self.make_job()
+        with self.fail_copy_of(self.lstFiles[1]):
+            job.copy_files()
+        job.create_log(self.pathDest)
+        self.assertFalse(job.check_metadata())
+        job.delete_source_files()
+        job.close_logs()
+        self.assertFalse(os.path.exists(self.lstFiles[0]))
+        self.assertTrue(os.path.exists(self.lstFiles[1]))
+        self.assertFalse(os.path.exists(self.lstFiles[2]))
+
+    def test_nothing_is_deleted_without_a_check(self):
+        job = self.make_job()
+        job.copy_files()
+        job.create_log(self.pathDest)
+        job.delete_source_files()
+        job.close_logs()
+        self.assertTrue(all(os.path.exists(path) for path in self.lstFiles))
+
+    def test_truncated_copy_fails_verification(self):
+        job = self.make_job(**{'Verify checksums after': True})
+        job.copy_files()
+        os.truncate(os.path.join(self.pathDest, 'folder', 'file2.txt'), 10)
+        job.create_log(self.pathDest)
+        self.assertFalse(job.verify_checksums())
+        job.delete_source_files()
+        job.close_logs()
+        self.assertTrue(os.path.exists(self.lstFiles[2]))
+        self.assertFalse(os.path.exists(self.lstFiles[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()